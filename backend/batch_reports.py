@@ -0,0 +1,260 @@
+# Batch Report Export
+# Renders the PDF health report for every user (or a list of users) into a
+# directory, e.g. for the monthly clinic export. Run from the backend directory:
+#
+#   python batch_reports.py --output exports/2026-10 [--workers N] [--users 1,2,3] [--ai-summary]
+#
+# Users are read from the database in pages of --batch-size, and each page's
+# report data is fetched with one query per table instead of one set per user.
+# PDFs are rendered across a process pool (one worker per core by default) and
+# written as report_<user_id>.pdf via an atomic rename, so re-running the same
+# command after a crash skips every report that was already finished.
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiomysql
+
+import server
+from pdf_generator import LOG_ROWS_PER_TYPE
+from report_renderer import render_report_file
+
+# Failures go to the log (stderr); stdout carries only the progress lines and the summary
+logger = logging.getLogger(__name__)
+
+
+def _render_one(kwargs: Dict[str, Any], path: str) -> Tuple[int, int, int]:
+    """Worker: render one report atomically. Returns (size, worker pid, worker peak RSS in KiB)."""
+    partial = f"{path}.partial"
+    try:
+        size = render_report_file(kwargs, partial)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    return size, os.getpid(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+async def _fetch_all(cur: aiomysql.DictCursor, query: str, params: tuple) -> List[Dict[str, Any]]:
+    await cur.execute(query, params)
+    return list(await cur.fetchall())
+
+
+async def stream_users(conn: aiomysql.Connection, batch_size: int, only: Optional[List[int]]):
+    """Yield pages of {"id", "username"} rows in id order (keyset pagination)."""
+    last_id = 0
+    async with conn.cursor(aiomysql.DictCursor) as cur:
+        while True:
+            if only is not None:
+                ids = [uid for uid in only if uid > last_id][:batch_size]
+                if not ids:
+                    return
+                rows = await _fetch_all(
+                    cur,
+                    f"SELECT id, username FROM users WHERE id IN ({_placeholders(ids)}) ORDER BY id",
+                    tuple(ids),
+                )
+                last_id = ids[-1]
+            else:
+                rows = await _fetch_all(
+                    cur,
+                    "SELECT id, username FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size),
+                )
+                if not rows:
+                    return
+                last_id = int(rows[-1]["id"])
+            if rows:
+                yield rows
+
+
+async def prefetch(conn: aiomysql.Connection, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Report inputs for a page of users: one query per table for the whole page."""
+    data: Dict[int, Dict[str, Any]] = {
+        uid: {"profile": None, "entries": [], "log": [], "counts": {}, "prescriptions": []} for uid in user_ids
+    }
+    ids = tuple(user_ids)
+    marks = _placeholders(user_ids)
+    thirty_days_ago = server.to_dt(datetime.utcnow() - timedelta(days=30))
+    async with conn.cursor(aiomysql.DictCursor) as cur:
+        for row in await _fetch_all(cur, f"SELECT * FROM health_profiles WHERE user_id IN ({marks})", ids):
+            data[int(row["user_id"])]["profile"] = row
+        for row in await _fetch_all(
+            cur,
+            f"SELECT * FROM timeline_entries WHERE user_id IN ({marks}) AND timestamp >= %s",
+            ids + (thirty_days_ago,),
+        ):
+            data[int(row["user_id"])]["entries"].append(row)
+        for row in await _fetch_all(
+            cur,
+            f"""
+            SELECT user_id, id, entry_type, title, description, severity, tags, timestamp FROM (
+                SELECT user_id, id, entry_type, title, description, severity, tags, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY user_id, entry_type ORDER BY timestamp DESC, id DESC) AS type_rank
+                FROM timeline_entries
+                WHERE user_id IN ({marks})
+            ) ranked
+            WHERE type_rank <= %s
+            ORDER BY user_id, timestamp DESC, id DESC
+            """,
+            ids + (LOG_ROWS_PER_TYPE,),
+        ):
+            data[int(row["user_id"])]["log"].append(row)
+        for row in await _fetch_all(
+            cur,
+            f"SELECT user_id, entry_type, COUNT(*) AS total FROM timeline_entries WHERE user_id IN ({marks}) GROUP BY user_id, entry_type",
+            ids,
+        ):
+            data[int(row["user_id"])]["counts"][row["entry_type"]] = int(row["total"])
+        # Same five most recent prescriptions as the report endpoint
+        for row in await _fetch_all(
+            cur,
+            f"""
+            SELECT * FROM (
+                SELECT p.*, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC) AS recent_rank
+                FROM prescriptions p
+                WHERE user_id IN ({marks})
+            ) ranked
+            WHERE recent_rank <= 5
+            """,
+            ids,
+        ):
+            row.pop("recent_rank", None)
+            data[int(row["user_id"])]["prescriptions"].append(row)
+    return data
+
+
+async def report_kwargs(username: str, user_data: Dict[str, Any], ai_summary: bool) -> Dict[str, Any]:
+    """Same derivation as the report endpoint, from prefetched rows."""
+    profile_data = dict(user_data["profile"])
+    insights = server._health_pattern_stats(user_data["entries"])
+    health_score_data = server._health_score_from_entries(user_data["entries"])
+    timeline_entries = [server._report_timeline_entry(entry) for entry in user_data["log"]]
+    prescriptions = [dict(p) for p in user_data["prescriptions"]]
+    if ai_summary:
+        summary, prescription_summary = await asyncio.gather(
+            server._report_ai_summary(username, profile_data, insights, health_score_data, timeline_entries),
+            server._report_prescription_summary(prescriptions),
+        )
+    else:
+        summary = server._report_fallback_summary(username, insights, health_score_data)
+        prescription_summary = None
+    return {
+        "username": username,
+        "profile_data": profile_data,
+        "timeline_entries": timeline_entries,
+        "insights_data": insights,
+        "ai_summary": summary,
+        "health_score_data": health_score_data,
+        "prescriptions": prescriptions,
+        "prescription_ai_summary": prescription_summary,
+        "entry_counts": user_data["counts"],
+    }
+
+
+async def export(args: argparse.Namespace) -> Dict[str, Any]:
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    for partial in output.glob("*.partial"):
+        partial.unlink()  # left behind by a crashed run
+
+    only = sorted({int(u) for u in args.users.split(",")}) if args.users else None
+    stats = {"users": 0, "rendered": 0, "skipped": 0, "no_profile": 0, "failed": 0, "bytes": 0}
+    worker_rss: Dict[int, int] = {}
+    loop = asyncio.get_running_loop()
+    # Keep the pool busy without materializing every pending report at once
+    in_flight = asyncio.Semaphore(args.workers * 2)
+    started = time.perf_counter()
+
+    async def render(user_id: int, kwargs: Dict[str, Any], path: Path) -> None:
+        try:
+            size, pid, rss = await loop.run_in_executor(executor, _render_one, kwargs, str(path))
+            stats["rendered"] += 1
+            stats["bytes"] += size
+            worker_rss[pid] = max(worker_rss.get(pid, 0), rss)
+        except Exception as e:
+            stats["failed"] += 1
+            logger.error(f"Report for user {user_id} failed to render: {e}")
+        finally:
+            in_flight.release()
+
+    conn = await aiomysql.connect(
+        host=server.MYSQL_HOST,
+        port=server.MYSQL_PORT,
+        user=server.MYSQL_USER,
+        password=server.MYSQL_PASSWORD,
+        db=server.MYSQL_DB,
+        autocommit=True,
+        charset="utf8mb4",
+    )
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    tasks: List["asyncio.Task[None]"] = []
+    try:
+        async for page in stream_users(conn, args.batch_size, only):
+            stats["users"] += len(page)
+            todo = []
+            for user in page:
+                path = output / f"report_{user['id']}.pdf"
+                if path.exists() and not args.force:
+                    stats["skipped"] += 1
+                else:
+                    todo.append((int(user["id"]), user["username"], path))
+            if not todo:
+                continue
+            data = await prefetch(conn, [uid for uid, _, _ in todo])
+            for user_id, username, path in todo:
+                if data[user_id]["profile"] is None:
+                    stats["no_profile"] += 1
+                    continue
+                kwargs = await report_kwargs(username, data[user_id], args.ai_summary)
+                await in_flight.acquire()
+                tasks.append(asyncio.create_task(render(user_id, kwargs, path)))
+            tasks = [t for t in tasks if not t.done()]
+            print(f"{stats['users']} users read, {stats['rendered']} rendered, {stats['skipped']} already done")
+        await asyncio.gather(*tasks)
+    finally:
+        # On an error mid-run, stop the renders not yet started and collect the rest
+        # before the pool goes away, so no task or callback outlives the executor
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        executor.shutdown(wait=True, cancel_futures=True)
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["reports_per_s"] = round(stats["rendered"] / elapsed, 2) if elapsed else 0.0
+    stats["worker_peak_rss_mib"] = sorted(round(kib / 1024, 1) for kib in worker_rss.values())
+    stats["main_peak_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render PDF health reports for many users")
+    parser.add_argument("--output", required=True, help="directory for report_<user_id>.pdf files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes (default: cores)")
+    parser.add_argument("--batch-size", type=int, default=200, help="users per prefetch page")
+    parser.add_argument("--users", help="comma-separated user ids (default: every user)")
+    parser.add_argument("--ai-summary", action="store_true", help="ask Gemini for each summary instead of the template text")
+    parser.add_argument("--force", action="store_true", help="re-render reports that already exist")
+    summary = asyncio.run(export(parser.parse_args()))
+    print(
+        f"\nRendered {summary['rendered']} report(s) in {summary['elapsed_s']}s "
+        f"({summary['reports_per_s']} reports/s); skipped {summary['skipped']} already exported, "
+        f"{summary['no_profile']} without a health profile, {summary['failed']} failed"
+    )
+    print(f"Peak RSS per worker (MiB): {summary['worker_peak_rss_mib']}; main process: {summary['main_peak_rss_mib']} MiB")
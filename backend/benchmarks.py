@@ -0,0 +1,703 @@
+# Backend micro-benchmarks
+# Run from the backend directory:  python benchmarks.py <name> [--iterations N]
+# Every benchmark runs offline: upstream services are replaced with local stubs.
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _report(label: str, samples_ms: List[float]) -> None:
+    print(
+        f"{label:<40} n={len(samples_ms):<6} "
+        f"mean={statistics.mean(samples_ms):8.3f}ms "
+        f"p50={_percentile(samples_ms, 50):8.3f}ms "
+        f"p99={_percentile(samples_ms, 99):8.3f}ms"
+    )
+
+
+# ==================== GEMINI MODEL HANDLES ====================
+
+def _stub_gemini_transport():
+    """Replace the Gemini async client with one that answers instantly."""
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    class StubAsyncClient:
+        async def generate_content(self, request, **kwargs):
+            return genai.protos.GenerateContentResponse(
+                candidates=[{"content": {"parts": [{"text": "stubbed"}], "role": "model"}}]
+            )
+
+    stub = StubAsyncClient()
+    genai_client.get_default_generative_async_client = lambda *a, **k: stub
+
+
+def bench_models(iterations: int) -> None:
+    import google.generativeai as genai
+    from gemini_models import ModelRegistry
+    import server
+
+    _stub_gemini_transport()
+    prompts = [p for p in server.KNOWN_SYSTEM_PROMPTS if p]
+    model_name = server.GEMINI_MODEL
+
+    async def per_call() -> List[float]:
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            model = genai.GenerativeModel(model_name=model_name, system_instruction=prompts[i % len(prompts)])
+            await model.generate_content_async("hello")
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    async def registry() -> List[float]:
+        reg = ModelRegistry()
+        reg.warm_up(model_name, prompts)
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            model = reg.get(model_name, prompts[i % len(prompts)])
+            await model.generate_content_async("hello")
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    before = asyncio.run(per_call())
+    after = asyncio.run(registry())
+    _report("GenerativeModel per call", before)
+    _report("Registry handle reuse", after)
+    saved = statistics.mean(before) - statistics.mean(after)
+    print(f"Construction overhead saved per call: {saved * 1000:.1f}us")
+
+
+# ==================== HEDGED REQUESTS ====================
+
+def bench_hedging(iterations: int) -> None:
+    from llm_hedging import Hedger
+    from llm_providers import FakeLLMProvider
+
+    concurrency = 20
+
+    async def drive(hedger) -> List[float]:
+        # Log-normal around ~40ms with a small share of 10-25x stragglers
+        fake = FakeLLMProvider(latency_ms=40, latency_sigma=0.35, straggler_rate=0.04, tokens=12)
+        samples: List[float] = []
+        queue = list(range(iterations))
+
+        def complete():
+            return fake.generate("fake", None, "Give a brief motivating message.")
+
+        async def worker():
+            while queue:
+                queue.pop()
+                start = time.perf_counter()
+                if hedger is None:
+                    await complete()
+                else:
+                    await hedger.run("challenge_feedback", complete)
+                samples.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        calls = fake.stats()["calls"]
+        extra = (calls - iterations) / iterations * 100
+        print(f"  upstream calls={calls} (+{extra:.1f}%)")
+        return samples
+
+    print("No hedging:")
+    _report("challenge_feedback", asyncio.run(drive(None)))
+    for pct, budget in ((95, 0.05), (90, 0.10)):
+        hedger = Hedger(percentile=pct, budget=budget)
+        print(f"Hedged at p{pct}, budget {budget:.0%}:")
+        _report("challenge_feedback", asyncio.run(drive(hedger)))
+        print(f"  {hedger.stats()['hedged']} hedges, {hedger.stats()['hedge_wins']} won by the hedge")
+
+
+# ==================== LLM STACK THROUGHPUT ====================
+
+def bench_llm(iterations: int) -> None:
+    """gemini_generate end to end (limiter, breaker, hedging) against the fake provider."""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("FAKE_LLM_ERROR_RATE", "0.01")
+    import server
+
+    concurrency = 64
+    sites = ["persona", "challenge_feedback", "insights", "symptom_analysis", "chat"]
+
+    async def drive() -> List[float]:
+        samples: List[float] = []
+        failures = 0
+        queue = list(range(iterations))
+
+        async def worker():
+            nonlocal failures
+            while queue:
+                i = queue.pop()
+                site = sites[i % len(sites)]
+                start = time.perf_counter()
+                try:
+                    await server.gemini_generate("You are a benchmark.", f"prompt {i}", site=site)
+                except Exception:
+                    failures += 1
+                samples.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        print(f"  {iterations / elapsed:.0f} calls/s at concurrency {concurrency}, {failures} failed")
+        return samples
+
+    print(f"Provider: {server.llm_provider.stats()}")
+    _report("gemini_generate (fake provider)", asyncio.run(drive()))
+    print(f"  limiter: {server.gemini_limiter.stats()}")
+    print(f"  provider: {server.llm_provider.stats()}")
+
+
+# ==================== REPORT RENDERING ====================
+
+def _synthetic_report(entries: int) -> Dict:
+    from datetime import datetime, timedelta
+
+    now = datetime.utcnow()
+    kinds = ["mood", "sleep", "hydration", "symptom", "meal"]
+    return {
+        "username": "bench",
+        "profile_data": {"sleep_pattern": "night_owl", "sleep_hours": 7, "hydration_level": "good",
+                         "stress_level": "moderate", "exercise_frequency": "regular", "diet_type": "balanced"},
+        "timeline_entries": [
+            {"entry_type": kinds[i % len(kinds)], "title": f"Entry {i}", "description": "Logged from the benchmark",
+             "severity": i % 5, "tags": ["mood:Calm"], "timestamp": (now - timedelta(hours=i)).isoformat()}
+            for i in range(entries)
+        ],
+        "insights_data": {"total_entries": entries, "symptoms_this_month": 4, "stress_free_days": 9,
+                          "hydration_logs": 20, "trends": {"symptom_trend": "stable", "hydration_trend": "good"}},
+        "ai_summary": "The patient logs consistently. " * 40,
+        "health_score_data": {"score": 78, "label": "Fairly balanced", "reason": "Steady logging."},
+        "prescriptions": [],
+        "prescription_ai_summary": None,
+    }
+
+
+def bench_report_render(iterations: int) -> None:
+    """Latency of a cheap request on the same event loop while reports render concurrently."""
+    from report_renderer import ReportRenderPool, render_report_pdf
+
+    report = _synthetic_report(500)
+    renders = max(4, iterations // 250)
+    concurrency = 4
+
+    async def drive(render) -> List[float]:
+        lag: List[float] = []
+        done = asyncio.Event()
+
+        async def api_probe():
+            # Stands in for other requests on the worker: a 5ms timer that should fire on time
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag.append((time.perf_counter() - start) * 1000 - 5)
+
+        async def renderer():
+            for _ in range(renders // concurrency):
+                await render()
+
+        probe = asyncio.create_task(api_probe())
+        started = time.perf_counter()
+        await asyncio.gather(*[renderer() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+        print(f"  {renders} reports in {elapsed:.2f}s ({renders / elapsed:.1f}/s)")
+        return lag
+
+    async def inline():
+        render_report_pdf(report)
+        await asyncio.sleep(0)
+
+    print("Rendering on the event loop:")
+    _report("added request latency", asyncio.run(drive(inline)))
+
+    async def pooled() -> List[float]:
+        pool = ReportRenderPool(workers=2, max_pending=8)
+        await pool.start()
+        try:
+            return await drive(lambda: pool.render(**report))
+        finally:
+            await pool.stop()
+
+    print("Rendering in a 2-process pool:")
+    _report("added request latency", asyncio.run(pooled()))
+
+
+def bench_report_memory(iterations: int) -> None:
+    """Peak Python heap (tracemalloc) rendering one report, by timeline size."""
+    import tempfile
+    import tracemalloc
+    from io import BytesIO
+
+    from reportlab.pdfgen import canvas
+
+    import pdf_generator
+    from report_renderer import render_report_file
+
+    class SavedStateCanvas(canvas.Canvas):
+        # The previous footer implementation: keeps a copy of the canvas state per page
+        def __init__(self, *args, **kwargs):
+            canvas.Canvas.__init__(self, *args, **kwargs)
+            self._saved_page_states = []
+
+        def showPage(self):
+            self._saved_page_states.append(dict(self.__dict__))
+            self._startPage()
+
+        def save(self):
+            for state in self._saved_page_states:
+                self.__dict__.update(state)
+                canvas.Canvas.showPage(self)
+            canvas.Canvas.save(self)
+
+    def in_memory(report: Dict) -> int:
+        return len(pdf_generator.create_health_report_pdf(**report).getvalue())
+
+    def legacy(report: Dict) -> int:
+        current = pdf_generator.NumberedCanvas
+        pdf_generator.NumberedCanvas = SavedStateCanvas
+        try:
+            return in_memory(report)
+        finally:
+            pdf_generator.NumberedCanvas = current
+
+    def spooled(report: Dict) -> int:
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+            return render_report_file(report, f.name)
+
+    def measure(render, report: Dict):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = render(report)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, size, elapsed
+
+    spooled(_synthetic_report(10))  # imports and font caches outside the measurement
+    for entries in (10, 1_000, 50_000):
+        report = _synthetic_report(entries)
+        for label, render in (("saved page states, BytesIO", legacy), ("in memory", in_memory), ("spooled to file", spooled)):
+            peak, size, elapsed = measure(render, report)
+            print(f"{entries:>6} entries  {label:<28} peak={peak / 1024:8.1f}KiB  pdf={size / 1024:6.1f}KiB  {elapsed * 1000:8.1f}ms")
+
+
+def bench_report_template(iterations: int) -> None:
+    """Reports/sec for a typical user, rebuilding the styles per report vs. reusing the template."""
+    import pdf_generator
+
+    report = _synthetic_report(120)
+    report["prescriptions"] = [
+        {"medication_name": name, "dosage": "500mg", "frequency": "Twice daily", "timing": "With meals",
+         "purpose": "As prescribed", "side_effects": "Nausea, headache"}
+        for name in ("Metformin", "Amoxicillin", "Cetirizine")
+    ]
+    report["prescription_ai_summary"] = "Take each medication as prescribed. " * 4
+    reports = max(20, iterations // 20)
+
+    def run(rebuild: bool) -> List[float]:
+        samples = []
+        for _ in range(reports):
+            start = time.perf_counter()
+            if rebuild:
+                pdf_generator._template = None  # what every report used to pay
+            pdf_generator.create_health_report_pdf(**report)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    run(False)
+    for label, rebuild in (("styles built per report", True), ("shared template", False)):
+        samples = run(rebuild)
+        _report(label, samples)
+        print(f"  {1000 / statistics.mean(samples):.1f} reports/s")
+
+
+# ==================== TIMELINE EXPORT ====================
+
+def bench_timeline_export(iterations: int) -> None:
+    """Encode 1M timeline rows for /api/timeline/export: throughput and peak memory per format."""
+    import tracemalloc
+    from datetime import datetime, timedelta
+
+    import server
+
+    rows = 1_000_000
+    traced_rows = 100_000  # tracemalloc slows encoding ~10x; memory is flat, so a smaller run shows the peak
+    start_ts = datetime(2024, 1, 1)
+    kinds = ["mood", "sleep", "hydration", "symptom", "note"]
+
+    async def source(n: int):
+        # Stands in for the server-side cursor: rows are produced one at a time, never held
+        for i in range(n):
+            yield {
+                "id": i + 1, "entry_type": kinds[i % 5], "title": f"Entry {i}",
+                "description": "Logged from the benchmark" if i % 3 else None, "severity": i % 5 + 1,
+                "tags": '["mood:Calm", "intensity:3"]', "timestamp": start_ts + timedelta(minutes=i),
+            }
+
+    async def drain(n: int, export_format: str, compress: bool):
+        size = chunks = 0
+        async for chunk in server._timeline_export_chunks(source(n), export_format, compress):
+            size += len(chunk)
+            chunks += 1
+        return size, chunks
+
+    for label, export_format, compress in (("ndjson", "ndjson", False), ("csv", "csv", False), ("ndjson + gzip", "ndjson", True)):
+        started = time.perf_counter()
+        size, chunks = asyncio.run(drain(rows, export_format, compress))
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        asyncio.run(drain(traced_rows, export_format, compress))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{label:<14} {rows} rows in {elapsed:6.2f}s ({rows / elapsed:7.0f} rows/s)  "
+            f"{size / 1e6:6.1f}MB in {chunks} chunks  peak={peak / 1024:6.1f}KiB over {traced_rows} rows"
+        )
+
+
+# ==================== PASSWORD HASHING ====================
+
+def bench_login_storm(iterations: int) -> None:
+    """p99 of /api/health on the same worker while a burst of logins runs bcrypt."""
+    import logging
+
+    import httpx
+    from passlib.hash import bcrypt
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    import server
+
+    logins = max(16, iterations // 50)
+    concurrency = 16
+    stored = bcrypt.using(rounds=server.password_hasher.rounds).hash("correct horse")
+
+    async def fetch_one(query, params=None):
+        return {"id": 1, "password_hash": stored}
+
+    async def execute(query, params=None):
+        return 0
+
+    server.fetch_one = fetch_one
+    server.execute = execute
+    hasher = server.password_hasher
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    class InlineHasher:
+        # The previous handler code: bcrypt straight on the event loop
+        async def verify(self, password, hashed):
+            return bcrypt.verify(password, hashed), None
+
+    async def storm(hasher) -> List[float]:
+        server.password_hasher = hasher
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            latencies: List[float] = []
+            queue = list(range(logins))
+            done = asyncio.Event()
+
+            async def probe():
+                # A request arrives every 5ms; its latency counts from arrival, including time the loop was blocked
+                while not done.is_set():
+                    arrival = time.perf_counter() + 0.005
+                    await asyncio.sleep(0.005)
+                    await client.get("/api/health")
+                    latencies.append((time.perf_counter() - arrival) * 1000)
+
+            async def login():
+                while queue:
+                    queue.pop()
+                    response = await client.post("/api/auth/login", json={"username": "bench", "password": "correct horse"})
+                    assert response.status_code == 200, response.text
+
+            probe_task = asyncio.create_task(probe())
+            started = time.perf_counter()
+            await asyncio.gather(*[login() for _ in range(concurrency)])
+            elapsed = time.perf_counter() - started
+            done.set()
+            await probe_task
+            print(f"  {logins} logins in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+            return latencies
+
+    print(f"bcrypt rounds={hasher.rounds}, {logins} logins at concurrency {concurrency}")
+    print("bcrypt on the event loop:")
+    _report("/api/health during logins", asyncio.run(storm(InlineHasher())))
+    print(f"bcrypt on {hasher.workers} hasher thread(s):")
+    _report("/api/health during logins", asyncio.run(storm(hasher)))
+    print(f"  hasher: {hasher.stats()}")
+
+
+# ==================== RATE LIMITING ====================
+
+def bench_rate_limit(iterations: int) -> None:
+    """Cost of one rate limit decision (user + IP bucket) with the in-process store."""
+    from rate_limiter import BucketLimit, MemoryBucketStore, RateLimited, RateLimiter
+
+    decisions = iterations * 100
+    user_limit = BucketLimit(per_minute=12, burst=20)
+    ip_limit = BucketLimit(per_minute=60, burst=60)
+
+    def per_decision(label: str, elapsed: float, count: int) -> None:
+        print(f"{label:<40} {count / elapsed:10.0f} decisions/s  {elapsed / count * 1e6:6.2f}us each")
+
+    for label, users in (("take_at, 1 hot user", 1), ("take_at, 10k users", 10_000), ("take_at, 200k users (evicting)", 200_000)):
+        store = MemoryBucketStore(max_keys=100_000)
+        keys = [((f"user:{u}", user_limit), (f"ip:10.0.{u % 256}.{u // 256 % 256}", ip_limit)) for u in range(users)]
+        started = time.perf_counter()
+        for i in range(decisions):
+            store.take_at(keys[i % users], 1, i * 0.001)
+        per_decision(label, time.perf_counter() - started, decisions)
+
+    limiter = RateLimiter(MemoryBucketStore(), user_limit, ip_limit, {"chat": 1})
+
+    async def drive() -> int:
+        limited = 0
+        for i in range(decisions):
+            try:
+                await limiter.check("chat", f"u{i % 5_000}", f"10.0.{i % 256}.{i // 256 % 256}")
+            except RateLimited:
+                limited += 1
+        return limited
+
+    started = time.perf_counter()
+    limited = asyncio.run(drive())
+    per_decision("RateLimiter.check (awaited)", time.perf_counter() - started, decisions)
+    print(f"  {limited} of {decisions} limited")
+
+
+# ==================== FAST JSON RESPONSES ====================
+
+def bench_fast_json(iterations: int) -> None:
+    """List endpoints at 1k rows: response models vs. FAST_JSON_RESPONSES, checking the bodies match."""
+    import json
+    import logging
+    from datetime import datetime, timedelta
+
+    import httpx
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    import server
+
+    if server.orjson is None:
+        print("orjson is not installed")
+        return
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rows = 1000
+    requests = max(5, iterations // 100)
+    start = datetime(2026, 1, 1, 8, 30)
+
+    def when(i: int) -> datetime:
+        # Whole seconds and microseconds both occur in real rows
+        return start + timedelta(minutes=i, microseconds=(i * 7919) % 1_000_000 if i % 2 else 0)
+
+    tables = {
+        "timeline_entries": [
+            {
+                "id": i, "user_id": 1, "entry_type": "mood", "title": f"Entry {i} \u2014 caf\u00e9 \U0001F600",
+                "description": None if i % 3 else "Felt \"fine\"\nafter lunch", "severity": None if i % 4 else i % 5,
+                "tags": json.dumps(["mood:Calm", "intensity:low"]) if i % 5 else None, "timestamp": when(i),
+            }
+            for i in range(rows)
+        ],
+        "challenges": [
+            {
+                "id": i, "user_id": 1, "challenge_type": "hydration", "duration_days": 7, "title": f"Drink water {i}",
+                "description": "Eight cups a day", "start_date": when(i), "end_date": when(i) + timedelta(days=7),
+                "completed_days": i % 7, "is_active": 1, "is_completed": 0,
+                "badges": json.dumps(["first_day"]) if i % 2 else None, "created_at": when(i),
+            }
+            for i in range(rows)
+        ],
+        "reminders": [
+            {
+                "id": i, "user_id": 1, "reminder_type": "water", "frequency_hours": 2, "message": f"Hydrate! #{i}",
+                "is_sarcastic": i % 2, "is_active": 1, "last_sent": None if i % 2 else when(i), "created_at": when(i),
+            }
+            for i in range(rows)
+        ],
+        "prescriptions": [
+            {
+                "id": i, "user_id": 1, "medication_name": f"Medication {i}", "dosage": "5mg", "frequency": None,
+                "timing": "morning", "purpose": None, "side_effects": "Drowsiness", "interactions": None,
+                "personalized_advice": "Take with food", "extracted_text": "Rx\n" + "line of OCR text " * 40,
+                "ai_analysis": "Summary of the prescription. " * 30, "created_at": when(i),
+            }
+            for i in range(rows)
+        ],
+    }
+
+    async def fetch_one(query, params=None):
+        return {"id": 1}
+
+    async def fetch_all(query, params=None):
+        return next(table_rows for table, table_rows in tables.items() if f"FROM {table}" in query)
+
+    server.fetch_one = fetch_one
+    server.fetch_all = fetch_all
+    headers = {"Authorization": f"Bearer {server.create_token('bench')}"}
+    paths = {
+        "timeline_entries": f"/api/timeline/entries?limit={rows}",
+        "challenges": "/api/challenges/active",
+        "reminders": "/api/reminders/active",
+        "prescriptions": f"/api/prescriptions/history?limit={rows}",
+    }
+
+    async def run(path: str, fast: bool):
+        server.FAST_JSON_RESPONSES = fast
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get(path, headers=headers)  # warm-up
+            samples: List[float] = []
+            body = b""
+            for _ in range(requests):
+                began = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                samples.append((time.perf_counter() - began) * 1000)
+                assert response.status_code == 200, response.text
+                body = response.content
+            return samples, body
+
+    for table, path in paths.items():
+        model_ms, model_body = asyncio.run(run(path, False))
+        fast_ms, fast_body = asyncio.run(run(path, True))
+        if fast_body != model_body:
+            raise SystemExit(f"{table}: fast response differs from the response model output")
+        print(f"{table}: {rows} rows, {len(fast_body) / 1024:.0f} KiB, bodies identical")
+        _report("  response_model", model_ms)
+        _report("  FAST_JSON_RESPONSES", fast_ms)
+
+
+# ==================== RESPONSE COMPRESSION ====================
+
+def bench_compression(iterations: int) -> None:
+    """Bytes on the wire and compression CPU per endpoint, by Accept-Encoding."""
+    import json
+    import logging
+    import random
+    from datetime import datetime, timedelta
+
+    import httpx
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    import server
+
+    if not server.COMPRESSION_ENABLED:
+        print("COMPRESSION_ENABLED is off")
+        return
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    requests = max(5, iterations // 100)
+    now = datetime.utcnow()
+    rnd = random.Random(5)
+    vocabulary = (
+        "water sleep stress headache morning evening tablet dose blood pressure walk meal caffeine screen "
+        "routine symptoms energy mood doctor rest hydration breakfast dizziness nausea week improve notice "
+        "try keep avoid helps because after before daily twice relax breathing stretch log pattern"
+    ).split()
+
+    def text(words: int) -> str:
+        # Varied prose: repeating one sentence would overstate the compression ratio
+        return " ".join(rnd.choice(vocabulary) for _ in range(words)).capitalize() + "."
+
+    tables = {
+        "chat_messages": [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": text(15) if i % 2 == 0 else text(180),
+             "timestamp": now - timedelta(minutes=100 - i)}
+            for i in range(50)
+        ],
+        "prescriptions": [
+            {
+                "id": i, "user_id": 1, "medication_name": f"Medication {i}", "dosage": "5mg", "frequency": "twice daily",
+                "timing": "morning and evening", "purpose": "Blood pressure", "side_effects": "Dizziness, dry cough",
+                "interactions": "Avoid NSAIDs", "personalized_advice": text(120),
+                "extracted_text": text(200), "ai_analysis": text(350),
+                "created_at": now - timedelta(days=i),
+            }
+            for i in range(20)
+        ],
+        "timeline_entries": [
+            {"id": i, "user_id": 1, "entry_type": ["mood", "sleep", "hydration", "symptom"][i % 4], "title": f"Entry {i}",
+             "description": text(12) if i % 3 else None, "severity": i % 5 + 1,
+             "tags": json.dumps(["mood:Calm", "intensity:low"]), "timestamp": now - timedelta(hours=i)}
+            for i in range(50)
+        ],
+    }
+
+    async def fetch_one(query, params=None):
+        return {"id": 1}
+
+    async def fetch_all(query, params=None):
+        return next((rows for table, rows in tables.items() if f"FROM {table}" in query), [])
+
+    server.fetch_one = fetch_one
+    server.fetch_all = fetch_all
+    headers = {"Authorization": f"Bearer {server.create_token('bench')}"}
+    paths = ["/api/chat/history", "/api/prescriptions/history", "/api/timeline/entries", "/api/insights/patterns"]
+
+    async def run(path: str, accept: str):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            before = server.response_compression.stats()["routes"].get(path, {})
+            samples: List[float] = []
+            wire = 0
+            for _ in range(requests):
+                began = time.perf_counter()
+                async with client.stream("GET", path, headers={**headers, "Accept-Encoding": accept}) as response:
+                    assert response.status_code == 200, path
+                    wire = len(b"".join([raw async for raw in response.aiter_raw()]))
+                    encoding = response.headers.get("content-encoding", "identity")
+                samples.append((time.perf_counter() - began) * 1000)
+            after = server.response_compression.stats()["routes"][path]
+            cpu_ms = (after["cpu_ms"] - before.get("cpu_ms", 0.0)) / requests
+            return samples, wire, encoding, cpu_ms
+
+    print(f"brotli installed: {server.response_compression.stats()['brotli']}")
+    for path in paths:
+        print(path)
+        for accept in ("identity", "gzip", "br"):
+            samples, wire, encoding, cpu_ms = asyncio.run(run(path, accept))
+            print(
+                f"  Accept-Encoding {accept:<9} -> {encoding:<9} {wire:>8} bytes on the wire  "
+                f"{cpu_ms:6.3f}ms compression CPU  p50 {_percentile(samples, 50):6.2f}ms"
+            )
+
+
+BENCHMARKS: Dict[str, Callable[[int], None]] = {
+    "models": bench_models,
+    "hedging": bench_hedging,
+    "llm": bench_llm,
+    "report-render": bench_report_render,
+    "report-memory": bench_report_memory,
+    "report-template": bench_report_template,
+    "timeline-export": bench_timeline_export,
+    "login-storm": bench_login_storm,
+    "rate-limit": bench_rate_limit,
+    "fast-json": bench_fast_json,
+    "compression": bench_compression,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend micro-benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args.iterations)
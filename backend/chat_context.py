@@ -0,0 +1,121 @@
+"""
+Chat Context Cache
+The chat system prompt is built from the user's profile, recent timeline and
+recent prescriptions. Building it costs three queries, so the compiled text
+is cached per user and dropped whenever one of those tables is written.
+
+The cache is per process. Writes handled by another uvicorn worker are only
+seen here once ``ttl`` expires, which bounds how stale a context can get.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from llm_providers import estimate_tokens
+
+
+@dataclass
+class ContextSection:
+    """A titled block of lines. Lines are ordered most important first."""
+
+    title: str
+    lines: List[str]
+    footer: Optional[str] = None
+
+
+@dataclass
+class ChatContext:
+    text: str
+    tokens: int
+    trimmed_lines: int = 0
+    built_at: float = field(default_factory=time.monotonic)
+
+
+def compile_context(preamble: str, sections: List[ContextSection], token_budget: int) -> ChatContext:
+    """Join sections into one prompt, dropping trailing lines until it fits ``token_budget``.
+
+    Sections are listed in priority order: when over budget, lines are removed
+    from the last section first, and a section left empty is omitted.
+    """
+    kept = [list(s.lines) for s in sections]
+
+    def render() -> str:
+        text = preamble
+        for section, lines in zip(sections, kept):
+            if not lines:
+                continue
+            text += f"\n\n{section.title}:\n" + "".join(f"- {line}\n" for line in lines)
+            if section.footer:
+                text += f"\n{section.footer}"
+        return text
+
+    text = render()
+    trimmed = 0
+    idx = len(kept) - 1
+    while estimate_tokens(text) > token_budget and idx >= 0:
+        if not kept[idx]:
+            idx -= 1
+            continue
+        kept[idx].pop()
+        trimmed += 1
+        text = render()
+    return ChatContext(text=text, tokens=estimate_tokens(text), trimmed_lines=trimmed)
+
+
+class ChatContextCache:
+    """LRU of compiled chat contexts keyed by user id."""
+
+    def __init__(self, max_users: int = 2048, ttl: float = 600.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, ChatContext]" = OrderedDict()
+        # Bumped on every invalidation so a build that raced with a write is not cached
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "stale_builds": 0}
+
+    def _lookup(self, user_id: int) -> Optional[ChatContext]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.built_at > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    async def get(self, user_id: int, build: Callable[[int], Awaitable[ChatContext]]) -> ChatContext:
+        entry = self._lookup(user_id)
+        if entry is not None:
+            self.counters["hits"] += 1
+            return entry
+        self.counters["misses"] += 1
+        generation = self._generations.get(user_id, 0)
+        entry = await build(user_id)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                self.counters["stale_builds"] += 1
+                return entry
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "users": len(self._entries),
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+            **self.counters,
+        }
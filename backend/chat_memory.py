@@ -0,0 +1,96 @@
+"""
+Conversation Memory
+Keeps chat prompts a constant size however long a user has been chatting:
+the last ``recent_turns`` turns go into the prompt verbatim, and everything
+older is folded into a per-user rolling summary. The summary is refreshed in
+the background once ``refresh_every`` messages have aged out of the verbatim
+window, so the request path never waits on summarization.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from llm_providers import estimate_tokens
+
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and their health assistant. "
+    "Keep facts the assistant will need later: symptoms, medications, goals, preferences and advice given."
+)
+
+
+@dataclass
+class MemorySnapshot:
+    summary: Optional[str]
+    turns: List[Dict[str, Any]]  # oldest first: {"id", "role", "content"}
+    needs_refresh: bool
+    refresh_until_id: int  # newest message id the next summary should cover
+
+
+class ConversationMemory:
+    def __init__(self, recent_turns: int = 6, refresh_every: int = 10, summary_tokens: int = 250):
+        self.recent_turns = recent_turns
+        self.refresh_every = refresh_every
+        self.summary_tokens = summary_tokens
+
+    @property
+    def window_messages(self) -> int:
+        return self.recent_turns * 2
+
+    @property
+    def fetch_limit(self) -> int:
+        """Rows to read, newest first, to fill the window and detect a due refresh."""
+        return self.window_messages + self.refresh_every
+
+    def snapshot(self, summary_row: Optional[Dict[str, Any]], newest_first: List[Dict[str, Any]]) -> MemorySnapshot:
+        """Build the prompt memory from the stored summary and the newest unsummarized messages.
+
+        ``newest_first`` holds at most ``fetch_limit`` messages newer than the
+        summary. A full page means at least ``refresh_every`` messages have
+        fallen out of the verbatim window and are not yet summarized.
+        """
+        window = newest_first[:self.window_messages]
+        aged_out = newest_first[self.window_messages:]
+        needs_refresh = len(newest_first) >= self.fetch_limit
+        return MemorySnapshot(
+            summary=(summary_row or {}).get("summary") or None,
+            turns=list(reversed(window)),
+            needs_refresh=needs_refresh,
+            refresh_until_id=int(aged_out[0]["id"]) if aged_out else 0,
+        )
+
+    @staticmethod
+    def render_prompt(snapshot: MemorySnapshot, message: str) -> str:
+        parts = []
+        if snapshot.summary:
+            parts.append(f"Summary of the earlier conversation:\n{snapshot.summary}")
+        if snapshot.turns:
+            lines = [
+                f"{'User' if t['role'] == 'user' else 'Assistant'}: {t['content']}"
+                for t in snapshot.turns
+            ]
+            parts.append("Recent conversation:\n" + "\n".join(lines))
+        if not parts:
+            return message
+        parts.append(f"User: {message}")
+        return "\n\n".join(parts)
+
+    def summary_prompt(self, previous_summary: Optional[str], messages: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+        )
+        return (
+            f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            f"Rewrite the summary to include the new messages in at most {self.summary_tokens * 3 // 4} words. "
+            f"Return only the summary."
+        )
+
+    @staticmethod
+    def token_counts(system: str, snapshot: MemorySnapshot, prompt: str) -> Dict[str, int]:
+        return {
+            "system": estimate_tokens(system),
+            "summary": estimate_tokens(snapshot.summary or ""),
+            "turns": sum(estimate_tokens(t["content"]) for t in snapshot.turns),
+            "prompt": estimate_tokens(prompt),
+        }
@@ -0,0 +1,105 @@
+"""
+Circuit Breaker
+Stops calling an upstream dependency after repeated failures so handlers can
+fall back immediately instead of waiting on timeouts. After ``reset_timeout``
+seconds a limited number of probe calls are let through (half-open); a
+successful probe closes the circuit again.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the upstream while the circuit is open."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+            logging.info(f"Circuit '{self.name}' half-open, probing upstream")
+
+    def before_call(self) -> None:
+        """Raise CircuitOpen unless this call may go upstream."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                self.counters["rejected"] += 1
+                raise CircuitOpen(f"Circuit '{self.name}' is open")
+            if self._state == self.HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpen(f"Circuit '{self.name}' is half-open and already probing")
+                self._half_open_in_flight += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.counters["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                logging.info(f"Circuit '{self.name}' closed, upstream recovered")
+            self._state = self.CLOSED
+            self._half_open_in_flight = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.counters["opened"] += 1
+                    logging.warning(
+                        f"Circuit '{self.name}' opened after {self._consecutive_failures} consecutive failure(s)"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_in_flight = 0
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot for a call that ended without a verdict."""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "state": state,
+            "state_code": self._STATE_CODES[state],
+            "consecutive_failures": self._consecutive_failures,
+            **self.counters,
+        }
@@ -0,0 +1,230 @@
+"""
+Response Compression
+ASGI middleware that gzips (or, with the ``brotli`` package installed,
+brotli-compresses) text responses for clients that accept it. Chat history,
+prescription history and insights run to tens or hundreds of KB of JSON and
+shrink several times over, which matters most to phones on cellular.
+
+A response is left alone when it:
+- has a content type outside ``content_types`` (PDFs and images are already
+  compressed; Server-Sent Events must reach the client unbuffered),
+- already carries a Content-Encoding (e.g. the gzipped timeline export),
+- is a single body smaller than ``minimum_size``,
+- is a 206 partial response, or has no body at all (204, 304).
+
+Bodies of ``thread_bytes`` or more are compressed on a worker thread so a
+large response does not hold up the event loop; zlib and brotli release the
+GIL while they work. Bytes in and out and compression CPU time are counted
+per route in ``CompressionStats``.
+"""
+
+import asyncio
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+DEFAULT_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/plain",
+    "text/html",
+    "text/css",
+    "text/csv",
+    "image/svg+xml",
+)
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool) -> Optional[str]:
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header, honouring ``q=0``."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    if brotli_available and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionStats:
+    """Per-route totals: responses seen, compressed, bytes before/after and compression CPU."""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, compressed: bool, bytes_in: int, bytes_out: int, cpu_s: float) -> None:
+        with self._lock:
+            totals = self._routes.setdefault(
+                route, {"responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "cpu_ms": 0.0}
+            )
+            totals["responses"] += 1
+            totals["compressed"] += int(compressed)
+            totals["bytes_in"] += bytes_in
+            totals["bytes_out"] += bytes_out
+            totals["cpu_ms"] += cpu_s * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, t in sorted(self._routes.items()):
+                routes[route] = {
+                    **t,
+                    "cpu_ms": round(t["cpu_ms"], 2),
+                    "ratio": round(t["bytes_out"] / t["bytes_in"], 3) if t["bytes_in"] else None,
+                }
+            return {"brotli": brotli is not None, "routes": routes}
+
+
+class _Encoder:
+    """Streaming gzip or brotli encoder; CPU time spent is accumulated in ``cpu_s``."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.cpu_s = 0.0
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+            self._flush: Callable[[], bytes] = self._compressor.flush
+            self._finish: Callable[[], bytes] = self._compressor.finish
+            self._process: Callable[[bytes], bytes] = self._compressor.process
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+            self._process = self._compressor.compress
+
+    def encode(self, chunk: bytes, final: bool) -> bytes:
+        started = time.thread_time()
+        # Streamed chunks are flushed so the client sees each one as soon as it is sent
+        out = self._process(chunk) + (self._finish() if final else self._flush())
+        self.cpu_s += time.thread_time() - started
+        return out
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: Any,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        content_types: Tuple[str, ...] = DEFAULT_CONTENT_TYPES,
+        thread_bytes: int = 256 * 1024,
+        stats: Optional[CompressionStats] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = frozenset(content_types)
+        self.thread_bytes = thread_bytes
+        self.stats = stats or CompressionStats()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept, brotli is not None) if accept else None
+
+        start_message: Optional[Dict[str, Any]] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+        bytes_in = bytes_out = 0
+
+        def route_name() -> str:
+            # The router fills in the matched route while handling the request
+            route = scope.get("route")
+            return getattr(route, "path", None) or "(unmatched)"
+
+        def record(compressed: bool, cpu_s: float = 0.0) -> None:
+            self.stats.record(route_name(), compressed, bytes_in, bytes_out if compressed else bytes_in, cpu_s)
+
+        async def send_compressing(message: Dict[str, Any]) -> None:
+            nonlocal start_message, encoder, passthrough, bytes_in, bytes_out
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").split(b";")[0].strip().decode("latin-1").lower()
+                if (
+                    encoding is None
+                    or b"content-encoding" in headers
+                    or content_type not in self.content_types
+                    or message["status"] in (204, 206, 304)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if passthrough:
+                bytes_in += len(body)
+                if not more_body:
+                    record(False)
+                await send(message)
+                return
+
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    bytes_in += len(body)
+                    record(False)
+                    await send(start_message)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers = [
+                    (k, v) for k, v in start_message.get("headers", []) if k.lower() not in (b"content-length", b"vary")
+                ]
+                vary = [v for k, v in start_message.get("headers", []) if k.lower() == b"vary"]
+                vary_value = b", ".join(vary + [b"Accept-Encoding"])
+                headers += [(b"content-encoding", encoding.encode("latin-1")), (b"vary", vary_value)]
+                if not more_body:
+                    compressed = await self._encode(encoder, body, True)
+                    headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                    bytes_in, bytes_out = len(body), len(compressed)
+                    record(True, encoder.cpu_s)
+                    await send({**start_message, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start_message, "headers": headers})
+
+            compressed = await self._encode(encoder, body, not more_body)
+            bytes_in += len(body)
+            bytes_out += len(compressed)
+            if not more_body:
+                record(True, encoder.cpu_s)
+            if compressed or not more_body:
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressing)
+
+    async def _encode(self, encoder: _Encoder, body: bytes, final: bool) -> bytes:
+        if len(body) >= self.thread_bytes:
+            return await asyncio.to_thread(encoder.encode, body, final)
+        return encoder.encode(body, final)
@@ -0,0 +1,122 @@
+"""
+Gemini Model Registry
+Keeps one GenerativeModel per (model name, system instruction, generation config)
+so request handlers reuse model handles instead of rebuilding them on every call.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import google.generativeai as genai
+
+
+ModelKey = Tuple[str, Optional[str], Optional[str]]
+
+
+def _config_key(generation_config: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not generation_config:
+        return None
+    return json.dumps(generation_config, sort_keys=True, default=str)
+
+
+class ModelRegistry:
+    """Thread-safe cache of GenerativeModel handles.
+
+    Models registered through ``warm_up`` are pinned for the lifetime of the
+    process. Anything else (e.g. chat, whose system instruction embeds the
+    user's profile) lives in a bounded LRU so per-user prompts cannot grow
+    the registry without limit or evict the shared handles.
+    """
+
+    def __init__(self, max_dynamic: int = 64, factory: Optional[Callable[..., Any]] = None):
+        self.max_dynamic = max_dynamic
+        self._factory = factory or genai.GenerativeModel
+        self._pinned: Dict[ModelKey, Any] = {}
+        self._dynamic: "OrderedDict[ModelKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _build(self, model_name: str, system_instruction: Optional[str], generation_config: Optional[Dict[str, Any]]):
+        kwargs: Dict[str, Any] = {"model_name": model_name}
+        if system_instruction:
+            kwargs["system_instruction"] = system_instruction
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        return self._factory(**kwargs)
+
+    def get(
+        self,
+        model_name: str,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+    ):
+        """Return the shared model handle for this combination, creating it on first use."""
+        key = (model_name, system_instruction or None, _config_key(generation_config))
+        with self._lock:
+            model = self._pinned.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+            model = self._dynamic.get(key)
+            if model is not None:
+                self._dynamic.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+            model = self._build(model_name, system_instruction, generation_config)
+            self._dynamic[key] = model
+            while len(self._dynamic) > self.max_dynamic:
+                self._dynamic.popitem(last=False)
+            return model
+
+    def warm_up(
+        self,
+        model_name: str,
+        system_instructions: Iterable[Optional[str]],
+        generation_config: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Pre-build and pin a handle for each known system instruction."""
+        count = 0
+        with self._lock:
+            for instruction in system_instructions:
+                key = (model_name, instruction or None, _config_key(generation_config))
+                if key in self._pinned:
+                    continue
+                model = self._dynamic.pop(key, None)
+                if model is None:
+                    model = self._build(model_name, instruction, generation_config)
+                self._pinned[key] = model
+                count += 1
+        logging.info(f"Gemini model registry warmed {count} model handle(s) for {model_name}")
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pinned.clear()
+            self._dynamic.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pinned": len(self._pinned),
+                "dynamic": len(self._dynamic),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+model_registry = ModelRegistry()
+
+
+def get_model(
+    model_name: str,
+    system_instruction: Optional[str] = None,
+    generation_config: Optional[Dict[str, Any]] = None,
+):
+    return model_registry.get(model_name, system_instruction, generation_config)
@@ -41,6 +41,22 @@ def _parse_tags(raw: Any) -> Dict[str, List[str]]:
   return grouped
 
 
+def _sleep_hours(value: str) -> Optional[float]:
+  """Hours from a ``sleep:`` tag value such as "7.5h" or "9+"; None if unreadable."""
+  try:
+    return float(value.rstrip("hH+"))
+  except Exception:
+    return None
+
+
+def _cups(value: str) -> Optional[int]:
+  """Cups from a ``cups:`` tag value; None if unreadable."""
+  try:
+    return int(str(value))
+  except Exception:
+    return None
+
+
 def _clamp(value: float, lo: float, hi: float) -> float:
   return max(lo, min(hi, value))
 
@@ -126,11 +142,7 @@ def compute_health_score(entries: List[Dict[str, Any]], now: Optional[datetime]
     if entry_type == "sleep":
       hours_tags = tags.get("sleep", [])
       for h in hours_tags:
-        val = h.rstrip("hH+")
-        try:
-          h_val = float(val)
-        except Exception:
-          h_val = 0.0
+        h_val = _sleep_hours(h) or 0.0
         if h_val > 0:
           total_sleep_hours += h_val
           sleep_nights += 1
@@ -146,10 +158,7 @@ def compute_health_score(entries: List[Dict[str, Any]], now: Optional[datetime]
 
     if entry_type == "hydration":
       for c in tags.get("cups", []):
-        try:
-          cups_i = int(str(c))
-        except Exception:
-          cups_i = 0
+        cups_i = _cups(c) or 0
         if cups_i > 0:
           total_cups += cups_i
           hydration_logs += 1
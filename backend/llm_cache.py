@@ -0,0 +1,174 @@
+"""
+LLM Response Cache
+Content-addressed cache for Gemini completions whose prompts are fully
+determined by a few small inputs (personas, challenge feedback, insights...).
+
+Two tiers: an in-process LRU in front of a SQLite file shared by every
+worker on the host. Entries expire after the TTL chosen by each call site.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+def make_cache_key(
+    model_name: str,
+    system_message: Optional[str],
+    prompt: str,
+    generation_config: Optional[Dict[str, Any]] = None,
+) -> str:
+    payload = json.dumps(
+        [model_name, system_message or "", prompt, generation_config or {}],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: Optional[Path], memory_entries: int = 512):
+        self.db_path = Path(db_path) if db_path else None
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    # ---------- SQLite tier ----------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key=?", (key,)
+            ).fetchone()
+            if row and row[1] <= time.time():
+                conn.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                conn.commit()
+                return None
+            return (row[0], row[1]) if row else None
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            conn.commit()
+
+    def prune_expired(self) -> int:
+        with self._db_lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            cur = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+            return cur.rowcount
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._memory_lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._memory_lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    # ---------- public API ----------
+
+    def _count(self, site: str, outcome: str) -> None:
+        site_stats = self._stats.setdefault(site, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        site_stats[outcome] += 1
+
+    async def get(self, key: str, site: str = "default") -> Optional[str]:
+        value = self._memory_get(key)
+        if value is not None:
+            self._count(site, "memory_hits")
+            return value
+        try:
+            found = await asyncio.to_thread(self._disk_get, key)
+        except Exception as e:
+            logging.warning(f"LLM cache disk read failed: {e}")
+            found = None
+        if found is not None:
+            value, expires_at = found
+            self._memory_set(key, value, expires_at)
+            self._count(site, "disk_hits")
+            return value
+        self._count(site, "misses")
+        return None
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        expires_at = time.time() + ttl_seconds
+        self._memory_set(key, value, expires_at)
+        try:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+        except Exception as e:
+            logging.warning(f"LLM cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        sites = {}
+        total_hits = total_lookups = 0
+        for site, counts in self._stats.items():
+            hits = counts["memory_hits"] + counts["disk_hits"]
+            lookups = hits + counts["misses"]
+            total_hits += hits
+            total_lookups += lookups
+            sites[site] = {**counts, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+        return {
+            "memory_entries": len(self._memory),
+            "hit_rate": round(total_hits / total_lookups, 4) if total_lookups else 0.0,
+            "sites": sites,
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
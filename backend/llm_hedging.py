@@ -0,0 +1,102 @@
+"""
+Hedged LLM Requests
+For cheap, idempotent prompts: if the first attempt has not answered by a
+chosen percentile of recent latency, send a second identical attempt, keep
+whichever finishes first and cancel the other. A budget caps the share of
+requests that may be hedged so a slow upstream is not hit with double load.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from llm_metrics import LatencyWindow
+
+
+class Hedger:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window_size: int = 500,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self._latency: Dict[str, LatencyWindow] = {}
+        self.counters = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_denied": 0}
+
+    def _window(self, site: str) -> LatencyWindow:
+        window = self._latency.get(site)
+        if window is None:
+            window = self._latency[site] = LatencyWindow(self.window_size)
+        return window
+
+    def hedge_delay(self, site: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latency samples exist."""
+        window = self._window(site)
+        if len(window) < self.min_samples:
+            return None
+        value_ms = window.percentile(self.percentile)
+        return value_ms / 1000.0 if value_ms is not None else None
+
+    def _budget_allows(self) -> bool:
+        return self.counters["hedged"] + 1 <= self.budget * self.counters["requests"]
+
+    async def run(self, site: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.counters["requests"] += 1
+
+        primary = asyncio.ensure_future(attempt())
+        delay = self.hedge_delay(site)
+        if delay is None:
+            result = await primary
+            self._window(site).record((loop.time() - started) * 1000)
+            return result
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self._budget_allows():
+            if not done:
+                self.counters["budget_denied"] += 1
+            result = await primary
+            self._window(site).record((loop.time() - started) * 1000)
+            return result
+
+        self.counters["hedged"] += 1
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        self._window(site).record((loop.time() - started) * 1000)
+                        return task.result()
+                    first_error = first_error or task.exception()
+                    logging.debug(f"Hedged attempt for '{site}' failed: {task.exception()}")
+        finally:
+            for task in pending:
+                task.cancel()
+        raise first_error  # both attempts failed
+
+    def stats(self) -> Dict[str, Any]:
+        sites = {}
+        for site in self._latency:
+            delay = self.hedge_delay(site)
+            sites[site] = {"hedge_after_ms": round(delay * 1000, 1) if delay is not None else None}
+        return {
+            **self.counters,
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "sites": sites,
+        }
@@ -0,0 +1,159 @@
+"""
+Gemini Concurrency Limiter
+Bounds how many upstream Gemini calls a worker has in flight, queues a
+limited number of callers behind them, retries rate-limited calls with
+jittered exponential backoff and coalesces identical concurrent prompts so
+they share a single upstream request.
+
+Limits are per process; with several uvicorn workers the effective upstream
+ceiling is ``max_in_flight * workers``.
+"""
+
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+
+class LimiterSaturated(Exception):
+    """Raised when the wait queue is full or a caller waited too long for a slot."""
+
+
+def is_retryable_upstream_error(exc: BaseException) -> bool:
+    """True for 429 (quota / rate limit) and 503 (overloaded) responses."""
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if code in (429, 503):
+        return True
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable"):
+        return True
+    message = str(exc)
+    return "429" in message or "Resource has been exhausted" in message
+
+
+class GeminiLimiter:
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight_calls: Dict[str, "asyncio.Future[Any]"] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {
+            "calls": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "queue_timeouts": 0,
+            "rate_limited": 0,
+            "retries": 0,
+        }
+
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending
+            await self._semaphore.acquire()
+            return
+        if self.waiting >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise LimiterSaturated("Gemini wait queue is full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["queue_timeouts"] += 1
+            raise LimiterSaturated(f"Timed out after {self.queue_timeout}s waiting for a Gemini slot")
+        finally:
+            self.waiting -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many callers across the window
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _execute(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return await call()
+                except Exception as e:
+                    if not is_retryable_upstream_error(e):
+                        raise
+                    self.counters["rate_limited"] += 1
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    attempt += 1
+                    self.counters["retries"] += 1
+                    logging.warning(f"Gemini rate limited, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                    # Keep holding the slot while backing off so we do not add pressure upstream
+                    await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one in-flight slot for the duration of the block (used for streams)."""
+        self.counters["calls"] += 1
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def run(self, call: Callable[[], Awaitable[Any]], key: Optional[str] = None) -> Any:
+        """Run ``call`` under the limiter.
+
+        Callers passing the same ``key`` while a call is in flight share its
+        result. The shared call is shielded, so one caller disconnecting does
+        not cancel the request for the others.
+        """
+        self.counters["calls"] += 1
+        if key is None:
+            return await self._execute(call)
+
+        shared = self._in_flight_calls.get(key)
+        if shared is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(shared)
+
+        shared = asyncio.ensure_future(self._execute(call))
+        self._in_flight_calls[key] = shared
+
+        def _forget(f: "asyncio.Future[Any]") -> None:
+            if self._in_flight_calls.get(key) is f:
+                del self._in_flight_calls[key]
+            if not f.cancelled():
+                f.exception()  # mark retrieved; every waiting caller re-raises it
+
+        shared.add_done_callback(_forget)
+        return await asyncio.shield(shared)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.counters,
+        }
@@ -0,0 +1,45 @@
+"""
+LLM Latency Metrics
+Rolling windows of recent latency samples used for dashboards and for
+latency-driven decisions (e.g. when to hedge a slow request).
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyWindow:
+    """Keeps the most recent ``size`` samples (milliseconds)."""
+
+    def __init__(self, size: int = 500):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, value_ms: float) -> None:
+        with self._lock:
+            self._samples.append(value_ms)
+            self.count += 1
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 1) if value is not None else None
+
+        return {
+            "count": self.count,
+            "p50_ms": rounded(self.percentile(50)),
+            "p95_ms": rounded(self.percentile(95)),
+            "p99_ms": rounded(self.percentile(99)),
+        }
@@ -0,0 +1,321 @@
+"""
+LLM Providers
+The server talks to the language model through an ``LLMProvider``:
+``GeminiProvider`` calls Google Gemini, ``FakeLLMProvider`` answers locally
+with deterministic, schema-correct text so load tests and benchmarks run
+without network access or an API key.
+
+Select with LLM_PROVIDER=gemini|fake (see ``provider_from_env``).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class LLMProvider:
+    """Interface shared by every provider. Timeouts are in seconds."""
+
+    name = "base"
+
+    async def generate(
+        self,
+        model_name: str,
+        system_instruction: Optional[str],
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        raise NotImplementedError
+
+    async def generate_from_image(
+        self,
+        model_name: str,
+        prompt: str,
+        image_base64: str,
+        mime_type: str = "image/jpeg",
+        timeout: Optional[float] = None,
+    ) -> str:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        model_name: str,
+        system_instruction: Optional[str],
+        prompt: str,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Yield text chunks as they are produced.
+
+        Closing the iterator early (``aclose()``) releases the upstream stream.
+        """
+        raise NotImplementedError
+
+    def warm_up(self, model_name: str, system_instructions: Iterable[Optional[str]]) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name}
+
+
+# ==================== GEMINI ====================
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, registry=None):
+        if registry is None:
+            from gemini_models import model_registry as registry
+        self.registry = registry
+
+    async def generate(self, model_name, system_instruction, prompt, generation_config=None, timeout=None) -> str:
+        model = self.registry.get(model_name, system_instruction, generation_config)
+        resp = await model.generate_content_async(prompt, request_options={"timeout": timeout})
+        return (resp.text or "").strip()
+
+    async def generate_from_image(self, model_name, prompt, image_base64, mime_type="image/jpeg", timeout=None) -> str:
+        model = self.registry.get(model_name)
+        resp = await model.generate_content_async(
+            [prompt, {"inline_data": {"mime_type": mime_type, "data": image_base64}}],
+            request_options={"timeout": timeout},
+        )
+        return (resp.text or "").strip()
+
+    async def stream(self, model_name, system_instruction, prompt, timeout=None) -> AsyncIterator[str]:
+        model = self.registry.get(model_name, system_instruction)
+        upstream = await model.generate_content_async(prompt, stream=True, request_options={"timeout": timeout})
+        completed = False
+        try:
+            async for chunk in upstream:
+                try:
+                    text = chunk.text
+                except Exception:
+                    text = ""  # chunks without text parts (e.g. safety metadata)
+                if text:
+                    yield text
+            completed = True
+        finally:
+            if not completed:
+                await self._close_stream(upstream)
+
+    @staticmethod
+    async def _close_stream(response: Any) -> None:
+        """Stop an in-progress Gemini stream so the upstream call does not keep running."""
+        # The SDK does not expose a public close; its async iterator wraps the grpc call.
+        iterator = getattr(response, "_iterator", None)
+        if iterator is None:
+            return
+        try:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+            elif hasattr(iterator, "cancel"):
+                iterator.cancel()
+        except Exception as e:
+            logging.debug(f"Error closing Gemini stream: {e}")
+
+    def warm_up(self, model_name: str, system_instructions: Iterable[Optional[str]]) -> int:
+        return self.registry.warm_up(model_name, system_instructions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name, "models": self.registry.stats()}
+
+
+# ==================== FAKE ====================
+
+class FakeUpstreamError(Exception):
+    """Injected failure; ``code`` 503 makes it look like an overloaded upstream."""
+
+    def __init__(self, message: str, code: int = 503):
+        super().__init__(message)
+        self.code = code
+
+
+_FAKE_WORDS = (
+    "stay hydrated keep a steady sleep schedule take short walks after meals "
+    "notice how stress shows up in your body small consistent habits add up "
+    "track symptoms so patterns are easier to spot rest when you need it"
+).split()
+
+_FAKE_PRESCRIPTIONS = (
+    "Rx\nAmoxicillin 500mg capsule\n1 capsule three times daily for 7 days\nTake after meals",
+    "Rx\nMetformin 500mg tablet\n1 tablet twice daily with breakfast and dinner",
+    "Rx\nParacetamol 650mg tablet\n1 tablet every 6 hours as needed for fever\nCetirizine 10mg at bedtime",
+)
+
+
+class FakeLLMProvider(LLMProvider):
+    """Offline stand-in for load tests.
+
+    Responses depend only on the inputs, so repeated runs produce the same
+    text. Latency is log-normal around ``latency_ms`` (``latency_sigma`` 0
+    makes it fixed) with an optional share of 10-25x stragglers; failures are
+    injected at ``error_rate``. Latency and failures draw from a seeded RNG,
+    so a run with the same seed and call order is reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 40.0,
+        latency_sigma: float = 0.35,
+        straggler_rate: float = 0.0,
+        error_rate: float = 0.0,
+        tokens: int = 60,
+        seed: int = 7,
+        stream_chunk_tokens: int = 4,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.straggler_rate = straggler_rate
+        self.error_rate = error_rate
+        self.tokens = tokens
+        self.stream_chunk_tokens = max(1, stream_chunk_tokens)
+        self._rng = random.Random(seed)
+        self.counters = {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    # -- timing and failures --
+
+    def sample_latency(self) -> float:
+        """Seconds for the next call."""
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_sigma > 0:
+            latency = self._rng.lognormvariate(math.log(self.latency_ms / 1000.0), self.latency_sigma)
+        else:
+            latency = self.latency_ms / 1000.0
+        if self.straggler_rate and self._rng.random() < self.straggler_rate:
+            latency *= self._rng.uniform(10, 25)
+        return latency
+
+    async def _wait(self, latency: float, timeout: Optional[float]) -> None:
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"Fake LLM call exceeded its {timeout:g}s request timeout")
+        await asyncio.sleep(latency)
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.counters["errors"] += 1
+            raise FakeUpstreamError("Fake upstream unavailable (injected)")
+
+    # -- deterministic content --
+
+    @staticmethod
+    def _digest(*parts: Optional[str]) -> bytes:
+        h = hashlib.sha256()
+        for part in parts:
+            h.update((part or "").encode("utf-8"))
+            h.update(b"\0")
+        return h.digest()
+
+    def _text(self, digest: bytes) -> str:
+        rng = random.Random(digest)
+        words = [rng.choice(_FAKE_WORDS) for _ in range(max(1, self.tokens))]
+        sentences = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        return " ".join(s[0].upper() + s[1:] + "." for s in sentences)
+
+    def _prescription_json(self, prompt: str, digest: bytes) -> str:
+        # Medication names come from the OCR text embedded in the prompt, as the real model is asked to do
+        names = []
+        for line in prompt.splitlines():
+            first = line.strip().split(" ")[0]
+            if first[:1].isupper() and any(ch.isdigit() for ch in line) and "mg" in line.lower():
+                names.append(first)
+        if not names:
+            names = ["Paracetamol"]
+        medications = [
+            {
+                "medication_name": name,
+                "dosage": "As written on the prescription",
+                "frequency": "Twice daily",
+                "timing": "With meals",
+                "purpose": "Treats the condition it was prescribed for",
+                "side_effects": "Nausea, headache",
+                "interactions": "Avoid alcohol",
+                "personalized_advice": self._text(digest + name.encode("utf-8"))[:160],
+            }
+            for name in names[:5]
+        ]
+        return json.dumps({"medications": medications, "general_advice": "Take medications as prescribed."})
+
+    def _respond(self, system_instruction: Optional[str], prompt: str, generation_config: Optional[Dict[str, Any]]) -> str:
+        digest = self._digest(system_instruction, prompt)
+        wants_json = (generation_config or {}).get("response_mime_type") == "application/json"
+        if wants_json or '"medications"' in prompt:
+            return self._prescription_json(prompt, digest)
+        return self._text(digest)
+
+    def _account(self, prompt: str, output: str) -> None:
+        self.counters["prompt_tokens"] += estimate_tokens(prompt)
+        self.counters["completion_tokens"] += estimate_tokens(output)
+
+    # -- provider interface --
+
+    async def generate(self, model_name, system_instruction, prompt, generation_config=None, timeout=None) -> str:
+        self.counters["calls"] += 1
+        await self._wait(self.sample_latency(), timeout)
+        self._maybe_fail()
+        text = self._respond(system_instruction, prompt, generation_config)
+        self._account((system_instruction or "") + prompt, text)
+        return text
+
+    async def generate_from_image(self, model_name, prompt, image_base64, mime_type="image/jpeg", timeout=None) -> str:
+        self.counters["calls"] += 1
+        await self._wait(self.sample_latency(), timeout)
+        self._maybe_fail()
+        digest = self._digest(image_base64)
+        text = _FAKE_PRESCRIPTIONS[digest[0] % len(_FAKE_PRESCRIPTIONS)]
+        self._account(prompt, text)
+        return text
+
+    async def stream(self, model_name, system_instruction, prompt, timeout=None) -> AsyncIterator[str]:
+        self.counters["calls"] += 1
+        latency = self.sample_latency()
+        # First token after ~30% of the call's latency, the rest spread evenly
+        await self._wait(latency * 0.3, timeout)
+        self._maybe_fail()
+        words = self._respond(system_instruction, prompt, None).split(" ")
+        step = self.stream_chunk_tokens
+        chunks = [" ".join(words[i:i + step]) + " " for i in range(0, len(words), step)]
+        gap = latency * 0.7 / max(1, len(chunks) - 1)
+        self._account((system_instruction or "") + prompt, "".join(chunks))
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(gap)
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "latency_ms": self.latency_ms,
+            "error_rate": self.error_rate,
+            **self.counters,
+        }
+
+
+def provider_from_env() -> LLMProvider:
+    """Build the provider named by LLM_PROVIDER (default ``gemini``)."""
+    name = os.environ.get("LLM_PROVIDER", "gemini").lower()
+    if name == "fake":
+        return FakeLLMProvider(
+            latency_ms=float(os.environ.get("FAKE_LLM_LATENCY_MS", "40")),
+            latency_sigma=float(os.environ.get("FAKE_LLM_LATENCY_SIGMA", "0.35")),
+            straggler_rate=float(os.environ.get("FAKE_LLM_STRAGGLER_RATE", "0")),
+            error_rate=float(os.environ.get("FAKE_LLM_ERROR_RATE", "0")),
+            tokens=int(os.environ.get("FAKE_LLM_TOKENS", "60")),
+            seed=int(os.environ.get("FAKE_LLM_SEED", "7")),
+        )
+    if name != "gemini":
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected 'gemini' or 'fake')")
+    return GeminiProvider()
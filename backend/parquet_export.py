@@ -0,0 +1,217 @@
+# Timeline Parquet Export
+# Writes timeline_entries as Parquet for the data team, partitioned by the
+# entry's day. Run from the backend directory (needs `pip install pyarrow`):
+#
+#   python parquet_export.py --output analytics/timeline [--batch-size N]
+#
+# Layout: <output>/date=YYYY-MM-DD/part-<first id>-<last id>.parquet, readable
+# with pyarrow.dataset / pandas.read_parquet / DuckDB as one hive-partitioned
+# dataset. Tags are parsed with the same rules as the health score
+# (health_scoring._parse_tags), so mood, intensity, sleep hours, quality and
+# cups are real columns instead of JSON.
+#
+# Runs are incremental: <output>/_watermark.json records the highest entry id
+# exported (and the running row total), and the next run only reads newer rows
+# and adds new part files. The watermark moves after each batch's files are in
+# place; part files past the watermark (from a run that crashed mid-batch) are
+# removed on start and written again. Entries edited or deleted after export
+# are not revisited.
+#
+# Ids are assigned at insert but become visible at commit, so a row whose
+# transaction commits after a higher id was already exported falls below the
+# watermark and is skipped. Entries are written by single-statement
+# autocommit inserts, which keeps that window to a few milliseconds; run the
+# export at a quiet time, or do a full re-export into a fresh directory, if
+# every row must be present.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiomysql
+
+import server
+from health_scoring import _cups, _parse_tags, _sleep_hours
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only this command needs it
+    pa = pq = None
+
+
+WATERMARK_FILE = "_watermark.json"
+
+
+def export_schema() -> "pa.Schema":
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        pa.field("id", pa.int64(), nullable=False),
+        pa.field("user_id", pa.int64(), nullable=False),
+        pa.field("entry_type", dictionary, nullable=False),
+        pa.field("title", pa.string()),
+        pa.field("description", pa.string()),
+        pa.field("severity", pa.int8()),
+        pa.field("timestamp", pa.timestamp("ms", tz="UTC"), nullable=False),
+        pa.field("mood", dictionary),
+        pa.field("intensity", dictionary),
+        pa.field("sleep_hours", pa.float32()),
+        pa.field("quality", dictionary),
+        pa.field("cups", pa.int16()),
+        pa.field("tags", pa.list_(pa.string())),
+    ])
+
+
+def _first(values: List[str]) -> Optional[str]:
+    return values[0] if values else None
+
+
+def to_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """One export row from a timeline_entries row."""
+    raw_tags = row.get("tags")
+    if isinstance(raw_tags, str):
+        try:
+            raw_tags = json.loads(raw_tags)
+        except Exception:
+            raw_tags = []
+    tags = _parse_tags(raw_tags)
+    sleep = _first(tags.get("sleep", []))
+    cups = _first(tags.get("cups", []))
+    severity = row.get("severity")
+    return {
+        "id": int(row["id"]),
+        "user_id": int(row["user_id"]),
+        "entry_type": row["entry_type"],
+        "title": row.get("title"),
+        "description": row.get("description"),
+        "severity": int(severity) if severity is not None else None,
+        "timestamp": row["timestamp"],
+        "mood": _first(tags.get("mood", [])),
+        "intensity": _first(tags.get("intensity", [])),
+        "sleep_hours": _sleep_hours(sleep) if sleep is not None else None,
+        "quality": _first(tags.get("quality", [])),
+        "cups": _cups(cups) if cups is not None else None,
+        "tags": [str(t) for t in raw_tags] if isinstance(raw_tags, list) else [],
+    }
+
+
+def build_table(records: List[Dict[str, Any]]) -> "pa.Table":
+    return pa.Table.from_pylist(records, schema=export_schema())
+
+
+def read_watermark(output: Path) -> Tuple[int, int]:
+    """(highest exported id, rows exported by every run so far)."""
+    try:
+        state = json.loads((output / WATERMARK_FILE).read_text())
+    except FileNotFoundError:
+        return 0, 0
+    return int(state["last_id"]), int(state.get("rows", 0))
+
+
+def write_watermark(output: Path, last_id: int, rows: int, rows_last_run: int) -> None:
+    tmp = output / f".{WATERMARK_FILE}.partial"
+    tmp.write_text(json.dumps({
+        "last_id": last_id,
+        "rows": rows,
+        "rows_last_run": rows_last_run,
+        "updated_at": datetime.utcnow().isoformat(),
+    }))
+    os.replace(tmp, output / WATERMARK_FILE)
+
+
+def _part_first_id(path: Path) -> int:
+    return int(path.stem.split("-")[1])
+
+
+def remove_uncommitted(output: Path, watermark: int) -> int:
+    """Delete part files from a batch whose watermark was never written."""
+    removed = 0
+    for path in output.glob("date=*/*"):
+        if path.name.startswith(".") or (path.suffix == ".parquet" and _part_first_id(path) > watermark):
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def write_batch(output: Path, records: List[Dict[str, Any]], compression: str) -> int:
+    """Write one part file per day in ``records`` and return the number of files."""
+    by_day: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        by_day[record["timestamp"].strftime("%Y-%m-%d")].append(record)
+    name = f"part-{records[0]['id']:012d}-{records[-1]['id']:012d}.parquet"
+    for day, day_records in by_day.items():
+        directory = output / f"date={day}"
+        directory.mkdir(parents=True, exist_ok=True)
+        # Leading dot: readers skip it until the rename
+        tmp = directory / f".{name}.partial"
+        pq.write_table(build_table(day_records), tmp, compression=compression)
+        os.replace(tmp, directory / name)
+    return len(by_day)
+
+
+async def export(args: argparse.Namespace) -> Dict[str, Any]:
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    watermark, total_rows = read_watermark(output)
+    stats = {"start_id": watermark, "rows": 0, "files": 0, "batches": 0}
+    stats["removed_uncommitted"] = remove_uncommitted(output, watermark)
+    started = time.perf_counter()
+
+    conn = await aiomysql.connect(
+        host=server.MYSQL_HOST,
+        port=server.MYSQL_PORT,
+        user=server.MYSQL_USER,
+        password=server.MYSQL_PASSWORD,
+        db=server.MYSQL_DB,
+        autocommit=True,
+        charset="utf8mb4",
+    )
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            while True:
+                await cur.execute(
+                    """
+                    SELECT id, user_id, entry_type, title, description, severity, tags, timestamp
+                    FROM timeline_entries WHERE id > %s ORDER BY id LIMIT %s
+                    """,
+                    (watermark, args.batch_size),
+                )
+                rows = await cur.fetchall()
+                if not rows:
+                    break
+                records = [to_record(row) for row in rows]
+                stats["files"] += await asyncio.to_thread(write_batch, output, records, args.compression)
+                watermark = records[-1]["id"]
+                stats["rows"] += len(records)
+                stats["batches"] += 1
+                write_watermark(output, watermark, total_rows + stats["rows"], stats["rows"])
+                print(f"{stats['rows']} rows exported (through id {watermark})")
+    finally:
+        conn.close()
+
+    stats["end_id"] = watermark
+    stats["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export timeline entries as day-partitioned Parquet")
+    parser.add_argument("--output", required=True, help="dataset directory (created if missing)")
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows per query and per part file")
+    parser.add_argument("--compression", default="zstd", help="Parquet codec (zstd, snappy, gzip, none)")
+    cli_args = parser.parse_args()
+    if pa is None:
+        parser.exit(1, "parquet_export.py needs pyarrow: pip install pyarrow\n")
+    summary = asyncio.run(export(cli_args))
+    print(
+        f"\nExported {summary['rows']} new row(s) into {summary['files']} file(s) in {summary['elapsed_s']}s; "
+        f"watermark {summary['start_id']} -> {summary['end_id']}"
+    )
+    if summary["removed_uncommitted"]:
+        print(f"Removed {summary['removed_uncommitted']} file(s) left by an interrupted run")
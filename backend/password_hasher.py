@@ -0,0 +1,108 @@
+"""
+Password Hashing
+bcrypt is slow on purpose (roughly 100-300 ms of CPU per hash or check at
+the default work factor), so running it inside an async handler stalls every
+other request on the worker for the duration of a login. PasswordHasher runs
+it on a small thread pool instead (the bcrypt backend releases the GIL while
+it works) and bounds how many calls may be running or queued at once; beyond
+that ``hash`` and ``verify`` raise HasherSaturated and the handler answers 503.
+
+The work factor is ``rounds``. Hashes made with another factor still verify,
+and ``verify`` then also returns a replacement hash at the current factor, so
+accounts move over as their owners log in. That rehash is best-effort: when
+the pool is full it is skipped and tried again at the next login.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.hash import bcrypt
+
+from llm_metrics import LatencyWindow
+
+
+class HasherSaturated(Exception):
+    """Raised when too many password hashes are already running or queued."""
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 32):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._handler = bcrypt.using(rounds=rounds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.queue_ms = LatencyWindow()
+        self.hash_ms = LatencyWindow()
+        self.counters = {
+            "hashed": 0, "verified": 0, "mismatched": 0, "rehashed": 0, "rehash_skipped": 0, "rejected": 0,
+        }
+
+    def _timed(self, submitted: float, fn: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        self.queue_ms.record((started - submitted) * 1000)
+        try:
+            return fn(*args)
+        finally:
+            self.hash_ms.record((time.perf_counter() - started) * 1000)
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise HasherSaturated(f"{self.pending} password hash(es) already running or queued")
+            self.pending += 1
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+        # Released when the hash finishes, not when the caller stops waiting (e.g. client disconnect)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(self._handler.hash, password)
+        self.counters["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Check a password. Returns (matches, replacement hash if the work factor changed)."""
+        if not await self._run(self._handler.verify, password, hashed):
+            self.counters["mismatched"] += 1
+            return False, None
+        self.counters["verified"] += 1
+        # Only parses the hash's settings; no bcrypt work
+        if not self._handler.needs_update(hashed):
+            return True, None
+        try:
+            new_hash = await self.hash(password)
+        except HasherSaturated:
+            # The password was right; a login burst must not turn it into a 503
+            self.counters["rehash_skipped"] += 1
+            return True, None
+        self.counters["rehashed"] += 1
+        return True, new_hash
+
+    async def stop(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "queue_wait": self.queue_ms.stats(),
+            "hash": self.hash_ms.stats(),
+            **self.counters,
+        }
@@ -13,44 +13,248 @@ from reportlab.platypus import (
     PageBreak, Image, KeepTogether
 )
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from datetime import datetime
 from io import BytesIO
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, BinaryIO, Union
+import heapq
 import json
+import threading
+
+
+# Bump whenever the layout changes so cached reports are regenerated
+TEMPLATE_VERSION = 3
+
+# Rows shown per entry type in the detailed log
+LOG_ROWS_PER_TYPE = 20
 
 
 class NumberedCanvas(canvas.Canvas):
-    """Custom canvas with page numbers and headers."""
-    
+    """Custom canvas with page numbers and headers.
+
+    Each page is finished as soon as it is drawn. The page total is a form
+    XObject that every footer references and that is only defined in
+    ``save``, so no per-page canvas state is kept to draw "Page X of Y".
+    """
+
+    _PAGE_COUNT_FORM = "pageCount"
+    # Space reserved right of "Page X of " for the total (up to three digits)
+    _PAGE_COUNT_WIDTH = stringWidth("999", "Helvetica", 9)
+
     def __init__(self, *args, **kwargs):
         canvas.Canvas.__init__(self, *args, **kwargs)
-        self._saved_page_states = []
+        self._page_count = 0
 
     def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
+        self._page_count += 1
+        self.draw_page_number()
+        canvas.Canvas.showPage(self)
 
     def save(self):
-        num_pages = len(self._saved_page_states)
-        for state in self._saved_page_states:
-            self.__dict__.update(state)
-            self.draw_page_number(num_pages)
-            canvas.Canvas.showPage(self)
+        self.beginForm(self._PAGE_COUNT_FORM)
+        self.setFont("Helvetica", 9)
+        self.setFillColorRGB(0.5, 0.5, 0.5)
+        self.drawString(7.5 * inch - self._PAGE_COUNT_WIDTH, 0.5 * inch, str(self._page_count))
+        self.endForm()
         canvas.Canvas.save(self)
 
-    def draw_page_number(self, page_count):
+    def draw_page_number(self):
         self.setFont("Helvetica", 9)
         self.setFillColorRGB(0.5, 0.5, 0.5)
         self.drawRightString(
-            7.5 * inch, 0.5 * inch,
-            f"Page {self._pageNumber} of {page_count}"
+            7.5 * inch - self._PAGE_COUNT_WIDTH, 0.5 * inch,
+            f"Page {self._pageNumber} of "
         )
+        self.doForm(self._PAGE_COUNT_FORM)
         self.drawString(
             0.75 * inch, 0.5 * inch,
             f"Generated: {datetime.now().strftime('%B %d, %Y')}"
         )
 
 
+PROFILE_LABELS = {
+    'sleep_pattern': 'Sleep Pattern',
+    'sleep_hours': 'Sleep Hours',
+    'hydration_level': 'Hydration Level',
+    'stress_level': 'Stress Level',
+    'exercise_frequency': 'Exercise Frequency',
+    'diet_type': 'Diet Type'
+}
+
+TYPE_LABELS = {
+    'symptom': 'Symptoms',
+    'mood': 'Mood Logs',
+    'medicine': 'Medications',
+    'sleep': 'Sleep Records',
+    'hydration': 'Hydration',
+    'note': 'Notes'
+}
+
+DISCLAIMER_TEXT = """
+This health report is generated based on self-reported data and AI analysis. 
+It is intended for informational purposes only and should not be considered as 
+professional medical advice, diagnosis, or treatment. Always consult with a 
+qualified healthcare provider for medical advice and before making any decisions 
+about your health or treatment.
+
+The information in this report represents patterns and insights derived from 
+logged data and should be reviewed with your healthcare provider for accurate 
+medical interpretation.
+"""
+
+
+class ReportTemplate:
+    """Paragraph and table styles shared by every report.
+
+    Built once per process (see ``get_report_template``) and only read while
+    rendering, so concurrent renders on threads can share it and each pool
+    worker builds its own copy on first use. Flowables are not shared:
+    platypus sets layout state on them while building, so ``disclaimer``
+    returns a new Paragraph each time.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=rl_colors.HexColor('#1E293B'),
+            spaceAfter=6,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        )
+
+        self.subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=rl_colors.HexColor('#64748B'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica'
+        )
+
+        self.heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=rl_colors.HexColor('#0F172A'),
+            spaceAfter=12,
+            spaceBefore=20,
+            fontName='Helvetica-Bold'
+        )
+
+        self.body_style = ParagraphStyle(
+            'CustomBody',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=rl_colors.HexColor('#334155'),
+            spaceAfter=12,
+            alignment=TA_JUSTIFY,
+            fontName='Helvetica'
+        )
+
+        self.label_style = ParagraphStyle(
+            'CustomLabel',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=rl_colors.HexColor('#64748B'),
+            fontName='Helvetica-Bold'
+        )
+
+        self.type_heading_style = ParagraphStyle(
+            'TypeHeading',
+            parent=self.heading_style,
+            fontSize=13,
+            textColor=rl_colors.HexColor('#475569'),
+            spaceAfter=8,
+            spaceBefore=10,
+        )
+
+        self.info_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F1F5F9')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
+            ('PADDING', (0, 0), (-1, -1), 10),
+        ])
+
+        self.score_table_style = TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('PADDING', (0, 0), (-1, -1), 12),
+            ('BOX', (0, 0), (-1, -1), 1, rl_colors.HexColor('#CBD5E1')),
+        ])
+
+        self.profile_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F8FAFC')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#E2E8F0')),
+            ('PADDING', (0, 0), (-1, -1), 8),
+        ])
+
+        self.prescription_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), rl_colors.HexColor('#FEF3C7')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#E2E8F0')),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [rl_colors.white, rl_colors.HexColor('#FFF7ED')]),
+        ])
+
+        self.insights_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F1F5F9')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
+            ('PADDING', (0, 0), (-1, -1), 8),
+        ])
+
+        self.entry_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), rl_colors.HexColor('#E0E7FF')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.HexColor('#1E293B')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
+            ('PADDING', (0, 0), (-1, -1), 6),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [rl_colors.white, rl_colors.HexColor('#F8FAFC')]),
+        ])
+
+    def disclaimer(self) -> Paragraph:
+        return Paragraph(DISCLAIMER_TEXT, self.body_style)
+
+
+_template: Optional[ReportTemplate] = None
+_template_lock = threading.Lock()
+
+
+def get_report_template() -> ReportTemplate:
+    """The process-wide template, built on first use."""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ReportTemplate()
+    return _template
+
+
 def create_health_report_pdf(
     username: str,
     profile_data: Dict[str, Any],
@@ -60,6 +264,8 @@ def create_health_report_pdf(
     health_score_data: Dict[str, Any],
     prescriptions: Optional[List[Dict[str, Any]]] = None,
     prescription_ai_summary: Optional[str] = None,
+    output: Optional[Union[str, BinaryIO]] = None,
+    entry_counts: Optional[Dict[str, int]] = None,
 ) -> BytesIO:
     """
     Generate a comprehensive health report PDF.
@@ -67,15 +273,17 @@ def create_health_report_pdf(
     Args:
         username: Patient username
         profile_data: Health profile information
-        timeline_entries: All timeline logs
+        timeline_entries: Timeline logs; only the newest LOG_ROWS_PER_TYPE of each type are shown
         insights_data: Health insights and patterns
         ai_summary: AI-generated summary from Gemini
         health_score_data: Current health score breakdown
+        output: File path or binary file to write to instead of memory
+        entry_counts: Total entries per type when timeline_entries is only the newest rows
         
     Returns:
-        BytesIO: PDF file buffer
+        BytesIO: PDF file buffer (``output`` itself when given)
     """
-    buffer = BytesIO()
+    buffer = output if output is not None else BytesIO()
     doc = SimpleDocTemplate(
         buffer,
         pagesize=letter,
@@ -88,56 +296,11 @@ def create_health_report_pdf(
     # Container for the 'Flowable' objects
     story = []
     
-    # Define styles
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=rl_colors.HexColor('#1E293B'),
-        spaceAfter=6,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=rl_colors.HexColor('#64748B'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=rl_colors.HexColor('#0F172A'),
-        spaceAfter=12,
-        spaceBefore=20,
-        fontName='Helvetica-Bold'
-    )
-    
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=rl_colors.HexColor('#334155'),
-        spaceAfter=12,
-        alignment=TA_JUSTIFY,
-        fontName='Helvetica'
-    )
-    
-    label_style = ParagraphStyle(
-        'CustomLabel',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=rl_colors.HexColor('#64748B'),
-        fontName='Helvetica-Bold'
-    )
+    t = get_report_template()
+    title_style = t.title_style
+    subtitle_style = t.subtitle_style
+    heading_style = t.heading_style
+    body_style = t.body_style
     
     # Title Page
     story.append(Spacer(1, 0.5*inch))
@@ -154,16 +317,7 @@ def create_health_report_pdf(
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F1F5F9')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
-        ('PADDING', (0, 0), (-1, -1), 10),
-    ]))
+    info_table.setStyle(t.info_table_style)
     story.append(info_table)
     story.append(Spacer(1, 0.3*inch))
     
@@ -183,12 +337,7 @@ def create_health_report_pdf(
     ]
     
     score_table = Table(score_data, colWidths=[1.5*inch, 4.5*inch])
-    score_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('PADDING', (0, 0), (-1, -1), 12),
-        ('BOX', (0, 0), (-1, -1), 1, rl_colors.HexColor('#CBD5E1')),
-    ]))
+    score_table.setStyle(t.score_table_style)
     story.append(score_table)
     story.append(Spacer(1, 0.2*inch))
     
@@ -196,16 +345,7 @@ def create_health_report_pdf(
     story.append(Paragraph("Health Profile", heading_style))
     
     profile_items = []
-    profile_labels = {
-        'sleep_pattern': 'Sleep Pattern',
-        'sleep_hours': 'Sleep Hours',
-        'hydration_level': 'Hydration Level',
-        'stress_level': 'Stress Level',
-        'exercise_frequency': 'Exercise Frequency',
-        'diet_type': 'Diet Type'
-    }
-    
-    for key, label in profile_labels.items():
+    for key, label in PROFILE_LABELS.items():
         value = profile_data.get(key, 'N/A')
         if isinstance(value, str):
             value = value.replace('_', ' ').title()
@@ -214,16 +354,7 @@ def create_health_report_pdf(
         profile_items.append([label + ':', str(value)])
     
     profile_table = Table(profile_items, colWidths=[2*inch, 4*inch])
-    profile_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F8FAFC')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#E2E8F0')),
-        ('PADDING', (0, 0), (-1, -1), 8),
-    ]))
+    profile_table.setStyle(t.profile_table_style)
     story.append(profile_table)
 
     # Insert prescriptions section before insights if any
@@ -256,16 +387,7 @@ def create_health_report_pdf(
             ]
             
             pres_table = Table(pres_data, colWidths=[1.3*inch, 4.7*inch])
-            pres_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), rl_colors.HexColor('#FEF3C7')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#E2E8F0')),
-                ('PADDING', (0, 0), (-1, -1), 8),
-                ('ROWBACKGROUNDS', (0, 0), (-1, -1), [rl_colors.white, rl_colors.HexColor('#FFF7ED')]),
-            ]))
+            pres_table.setStyle(t.prescription_table_style)
             story.append(pres_table)
             story.append(Spacer(1, 0.12*inch))
             
@@ -306,16 +428,7 @@ def create_health_report_pdf(
     ]
     
     insights_table = Table(insights_items, colWidths=[2.5*inch, 3.5*inch])
-    insights_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), rl_colors.HexColor('#F1F5F9')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), rl_colors.HexColor('#0F172A')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
-        ('PADDING', (0, 0), (-1, -1), 8),
-    ]))
+    insights_table.setStyle(t.insights_table_style)
     story.append(insights_table)
     story.append(Spacer(1, 0.2*inch))
     
@@ -326,10 +439,16 @@ def create_health_report_pdf(
     story.append(Spacer(1, 0.2*inch))
     
     # Timeline Entries Section
+    if entry_counts is None:
+        entry_counts = {}
+        for entry in timeline_entries:
+            entry_type = entry.get('entry_type', 'other')
+            entry_counts[entry_type] = entry_counts.get(entry_type, 0) + 1
+    total_entries = sum(entry_counts.values())
     story.append(PageBreak())
     story.append(Paragraph("Detailed Health Log", heading_style))
     story.append(Paragraph(
-        f"Complete record of all logged health entries ({len(timeline_entries)} total entries)",
+        f"Complete record of all logged health entries ({total_entries} total entries)",
         body_style
     ))
     story.append(Spacer(1, 0.1*inch))
@@ -343,34 +462,23 @@ def create_health_report_pdf(
         entries_by_type[entry_type].append(entry)
     
     # Display entries by type
-    type_labels = {
-        'symptom': 'Symptoms',
-        'mood': 'Mood Logs',
-        'medicine': 'Medications',
-        'sleep': 'Sleep Records',
-        'hydration': 'Hydration',
-        'note': 'Notes'
-    }
+    type_labels = TYPE_LABELS
     
     for entry_type, entries in sorted(entries_by_type.items()):
         if not entries:
             continue
             
         story.append(Spacer(1, 0.15*inch))
-        type_heading = ParagraphStyle(
-            'TypeHeading',
-            parent=heading_style,
-            fontSize=13,
-            textColor=rl_colors.HexColor('#475569'),
-            spaceAfter=8,
-            spaceBefore=10,
-        )
-        story.append(Paragraph(type_labels.get(entry_type, entry_type.title()), type_heading))
+        type_label = type_labels.get(entry_type, entry_type.title())
+        type_total = entry_counts.get(entry_type, len(entries))
+        if type_total > LOG_ROWS_PER_TYPE:
+            type_label += f" ({LOG_ROWS_PER_TYPE} most recent of {type_total})"
+        story.append(Paragraph(type_label, t.type_heading_style))
         
         # Create table for this type
         entry_rows = [['Date', 'Entry', 'Details']]
         
-        for entry in sorted(entries, key=lambda x: x.get('timestamp', ''), reverse=True)[:20]:  # Limit to 20 most recent
+        for entry in heapq.nlargest(LOG_ROWS_PER_TYPE, entries, key=lambda x: x.get('timestamp', '')):
             timestamp = entry.get('timestamp', 'N/A')
             if timestamp != 'N/A':
                 try:
@@ -421,18 +529,7 @@ def create_health_report_pdf(
         
         if len(entry_rows) > 1:
             entry_table = Table(entry_rows, colWidths=[1*inch, 2*inch, 3*inch])
-            entry_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), rl_colors.HexColor('#E0E7FF')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), rl_colors.HexColor('#1E293B')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, rl_colors.HexColor('#CBD5E1')),
-                ('PADDING', (0, 0), (-1, -1), 6),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [rl_colors.white, rl_colors.HexColor('#F8FAFC')]),
-            ]))
+            entry_table.setStyle(t.entry_table_style)
             story.append(entry_table)
         else:
             story.append(Paragraph("No entries recorded", body_style))
@@ -440,21 +537,11 @@ def create_health_report_pdf(
     # Disclaimer
     story.append(PageBreak())
     story.append(Paragraph("Important Disclaimer", heading_style))
-    disclaimer_text = """
-    This health report is generated based on self-reported data and AI analysis. 
-    It is intended for informational purposes only and should not be considered as 
-    professional medical advice, diagnosis, or treatment. Always consult with a 
-    qualified healthcare provider for medical advice and before making any decisions 
-    about your health or treatment.
-    
-    The information in this report represents patterns and insights derived from 
-    logged data and should be reviewed with your healthcare provider for accurate 
-    medical interpretation.
-    """
-    story.append(Paragraph(disclaimer_text, body_style))
+    story.append(t.disclaimer())
     
     # Build PDF
     doc.build(story, canvasmaker=NumberedCanvas)
     
-    buffer.seek(0)
+    if isinstance(buffer, BytesIO):
+        buffer.seek(0)
     return buffer
@@ -0,0 +1,203 @@
+"""
+Rate Limiting
+Token buckets in front of the endpoints that call Gemini, so one client cannot
+use up the shared upstream quota. A request takes its route's cost in tokens
+from two buckets, one for the user and one for the client IP, and is allowed
+only if both hold enough; otherwise neither is charged and the caller gets
+the time until it would be allowed. Buckets refill continuously at
+``per_minute`` tokens a minute, up to ``burst``.
+
+Buckets live in a store. MemoryBucketStore keeps them in the process, so with
+several uvicorn workers each one enforces the limits on its own share of the
+traffic. RedisBucketStore keeps them in Redis, where every worker sees the
+same buckets; it needs the ``redis`` package and costs one round trip per
+decision. If the store fails, requests are let through and counted.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    per_minute: float
+    burst: float
+
+    @property
+    def per_second(self) -> float:
+        return self.per_minute / 60.0
+
+
+Buckets = Sequence[Tuple[str, BucketLimit]]
+
+
+class RateLimited(Exception):
+    """Raised when a request is over its limit; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Buckets in a dict, least recently used dropped past ``max_keys`` (a dropped bucket starts full)."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [tokens, updated_at]
+
+    async def take(self, buckets: Buckets, cost: float) -> float:
+        return self.take_at(buckets, cost, time.monotonic())
+
+    def take_at(self, buckets: Buckets, cost: float, now: float) -> float:
+        """Charge every bucket or none. Returns 0.0 when allowed, else seconds to wait."""
+        wait = 0.0
+        levels = []
+        for key, limit in buckets:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens = limit.burst
+            else:
+                tokens = min(limit.burst, state[0] + (now - state[1]) * limit.per_second)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / limit.per_second)
+            levels.append(tokens)
+        if wait > 0:
+            return wait
+        for (key, _), tokens in zip(buckets, levels):
+            state = self._buckets.get(key)
+            if state is None:
+                self._buckets[key] = [tokens - cost, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                state[0] = tokens - cost
+                state[1] = now
+                self._buckets.move_to_end(key)
+        return 0.0
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"store": self.name, "keys": len(self._buckets)}
+
+
+# Same arithmetic as MemoryBucketStore.take_at, atomic inside Redis.
+# KEYS: bucket keys. ARGV: cost, then per_second and burst for each key.
+# Returns the wait in seconds as a string (Lua numbers are truncated to integers in replies).
+_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i])
+  local burst = tonumber(ARGV[2 * i + 1])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = burst
+  if state[1] then
+    tokens = math.min(burst, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+  end
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / rate)
+  end
+  levels[i] = tokens
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i])
+  local burst = tonumber(ARGV[2 * i + 1])
+  redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+  -- A bucket idle long enough to refill is the same as no bucket
+  redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return '0'
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker, kept in Redis under ``prefix``."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, buckets: Buckets, cost: float) -> float:
+        args: List[float] = [cost]
+        for _, limit in buckets:
+            args.extend((limit.per_second, limit.burst))
+        wait = await self._take(keys=[self.prefix + key for key, _ in buckets], args=args)
+        return float(wait)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"store": self.name}
+
+
+def bucket_store_from_env() -> Any:
+    """Build the store named by RATE_LIMIT_STORE (default ``memory``)."""
+    name = os.environ.get("RATE_LIMIT_STORE", "memory").lower()
+    if name == "memory":
+        return MemoryBucketStore(max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000")))
+    if name != "redis":
+        raise ValueError(f"Unknown RATE_LIMIT_STORE '{name}' (expected 'memory' or 'redis')")
+    return RedisBucketStore(os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+
+
+class RateLimiter:
+    def __init__(self, store: Any, user_limit: BucketLimit, ip_limit: BucketLimit, costs: Dict[str, float]):
+        if user_limit.per_minute <= 0 or ip_limit.per_minute <= 0:
+            raise ValueError("Rate limits must refill at more than 0 tokens a minute")
+        for route, cost in costs.items():
+            if cost > min(user_limit.burst, ip_limit.burst):
+                raise ValueError(f"Rate limit cost for '{route}' ({cost}) exceeds the bucket size")
+        self.store = store
+        self.user_limit = user_limit
+        self.ip_limit = ip_limit
+        self.costs = costs
+        self.counters = {"allowed": 0, "limited": 0, "store_errors": 0}
+        self.limited_by_route: Dict[str, int] = {}
+
+    async def check(self, route: str, user: str, ip: Optional[str]) -> None:
+        """Charge ``route``'s cost to the user and IP, or raise RateLimited."""
+        buckets: List[Tuple[str, BucketLimit]] = [(f"user:{user}", self.user_limit)]
+        if ip:
+            buckets.append((f"ip:{ip}", self.ip_limit))
+        try:
+            wait = await self.store.take(buckets, self.costs.get(route, 1.0))
+        except Exception as e:
+            # Fail open: an unreachable store should not take the endpoints down with it
+            self.counters["store_errors"] += 1
+            logging.warning(f"Rate limit store error, allowing request: {e}")
+            return
+        if wait > 0:
+            self.counters["limited"] += 1
+            self.limited_by_route[route] = self.limited_by_route.get(route, 0) + 1
+            raise RateLimited(wait)
+        self.counters["allowed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.store.stats(),
+            "user_limit": {"per_minute": self.user_limit.per_minute, "burst": self.user_limit.burst},
+            "ip_limit": {"per_minute": self.ip_limit.per_minute, "burst": self.ip_limit.burst},
+            **self.counters,
+            "limited_by_route": dict(self.limited_by_route),
+        }
@@ -0,0 +1,173 @@
+"""
+Report Cache
+Generated PDFs kept on local disk, keyed by (user, data version, template
+version, day). The data version is bumped on every write that changes what a
+report shows, so a cached file is never stale: a write simply moves the user
+to a new key. The day is part of the key because the report's 7- and 30-day
+windows move even when nothing is written.
+
+ETags are derived from the key and the file's size and mtime, so they can be
+answered with a single ``stat`` and change whenever the bytes do. Files are
+evicted least-recently-used once the total size exceeds ``max_bytes``.
+
+Several workers may share the directory; each keeps its own LRU index and
+picks up files written by the others on first lookup.
+
+Reports are usually rendered straight into the directory: ``spool`` hands
+out a temporary path on the same filesystem and ``store_file`` renames the
+finished file into place, so the PDF is never held in memory.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+class ReportCache:
+    def __init__(self, directory: Path, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # file name -> size, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def make_key(user_id: int, data_version: int, template_version: int, day: str) -> str:
+        digest = hashlib.sha256(f"{data_version}:{template_version}:{day}".encode("utf-8")).hexdigest()[:24]
+        return f"u{user_id}-{digest}"
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    @staticmethod
+    def _etag(key: str, st: os.stat_result) -> str:
+        return f'"{key}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+    def load(self) -> int:
+        """Index files already on disk (oldest first) and trim to ``max_bytes``."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Spool files left behind by a crashed render
+        for path in self.directory.glob("*.tmp"):
+            try:
+                if time.time() - path.stat().st_mtime > 3600:
+                    path.unlink()
+            except OSError:
+                pass
+        files = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, path.name, st.st_size))
+        with self._lock:
+            self._index.clear()
+            self._total = 0
+            for _, name, size in sorted(files):
+                self._index[name] = size
+                self._total += size
+            self._evict_locked()
+            return len(self._index)
+
+    def lookup(self, key: str) -> Optional[Tuple[Path, str]]:
+        """Return (path, etag) for a cached report, or None."""
+        path = self.path_for(key)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._forget_locked(path.name)
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            if path.name in self._index:
+                self._index.move_to_end(path.name)
+            else:
+                # Written by another worker
+                self._index[path.name] = st.st_size
+                self._total += st.st_size
+            self.counters["hits"] += 1
+        return path, self._etag(key, st)
+
+    def spool(self) -> Path:
+        """Create an empty temporary file in the cache directory to render into."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        return Path(tmp)
+
+    def store(self, key: str, pdf: bytes) -> str:
+        """Write a report atomically, drop the user's older reports and return its ETag."""
+        tmp = self.spool()
+        try:
+            tmp.write_bytes(pdf)
+            return self.store_file(key, tmp)
+        except BaseException:
+            self.discard(tmp)
+            raise
+
+    def store_file(self, key: str, spooled: Path) -> str:
+        """Move a file from ``spool`` into place under ``key`` and return its ETag.
+
+        If the move fails the spooled file is left in place for the caller.
+        """
+        path = self.path_for(key)
+        os.replace(spooled, path)
+        st = path.stat()
+        user_prefix = key.split("-", 1)[0] + "-"
+        with self._lock:
+            # Older versions for this user can never be requested again
+            for name in [n for n in self._index if n.startswith(user_prefix) and n != path.name]:
+                self._remove_locked(name)
+            self._forget_locked(path.name)
+            self._index[path.name] = st.st_size
+            self._total += st.st_size
+            self.counters["stored"] += 1
+            self._evict_locked()
+        return self._etag(key, st)
+
+    @staticmethod
+    def discard(spooled: Path) -> None:
+        try:
+            os.unlink(spooled)
+        except OSError:
+            pass
+
+    def record_not_modified(self) -> None:
+        self.counters["not_modified"] += 1
+
+    def _forget_locked(self, name: str) -> None:
+        size = self._index.pop(name, None)
+        if size is not None:
+            self._total -= size
+
+    def _remove_locked(self, name: str) -> None:
+        self._forget_locked(name)
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Could not remove cached report {name}: {e}")
+
+    def _evict_locked(self) -> None:
+        while self._total > self.max_bytes and self._index:
+            name = next(iter(self._index))
+            self._remove_locked(name)
+            self.counters["evicted"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._index),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                **self.counters,
+            }
@@ -0,0 +1,152 @@
+"""
+Report Renderer
+Runs the reportlab PDF layout in a small process pool so a large report does
+not stall the event loop (and every other request on the worker) while it
+renders. Inputs must be picklable: plain dicts, lists, strings, numbers and
+datetimes, which is what the report handler passes.
+
+A bounded number of renders may be running or queued at once; beyond that
+``render`` raises RenderPoolSaturated and the handler answers 503. A render
+holds its slot until the worker is done with it, even if the caller stopped
+waiting, since a render already running in a worker cannot be stopped.
+
+``render_to_file`` has the worker write the PDF straight to a path, so the
+document never crosses the process pipe or sits in API memory; the handler
+streams the file from disk.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from llm_metrics import LatencyWindow
+
+
+class RenderPoolSaturated(Exception):
+    """Raised when too many reports are already rendering or queued."""
+
+
+def render_report_pdf(kwargs: Dict[str, Any]) -> bytes:
+    """Worker entry point: render one report and return the PDF bytes."""
+    from pdf_generator import create_health_report_pdf
+
+    return create_health_report_pdf(**kwargs).getvalue()
+
+
+def render_report_file(kwargs: Dict[str, Any], path: str) -> int:
+    """Worker entry point: render one report to ``path`` and return its size."""
+    from pdf_generator import create_health_report_pdf
+
+    with open(path, "wb") as f:
+        create_health_report_pdf(**kwargs, output=f)
+        return f.tell()
+
+
+def _ping() -> int:
+    return 0
+
+
+_WARM_UP_REPORT: Dict[str, Any] = {
+    "username": "warm-up",
+    "profile_data": {},
+    "timeline_entries": [],
+    "insights_data": {},
+    "ai_summary": "",
+    "health_score_data": {},
+}
+
+
+class ReportRenderPool:
+    def __init__(self, workers: int = 2, max_pending: int = 8):
+        """``workers`` 0 renders on a thread in this process instead of a pool."""
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.render_ms = LatencyWindow()
+        self.counters = {"rendered": 0, "rejected": 0, "failed": 0, "pool_restarts": 0}
+
+    def _new_executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=self.max_pending, thread_name_prefix="report-render")
+        # spawn: forking a process that runs an event loop and DB pool threads is unsafe
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def _replace_broken(self, executor: Executor) -> None:
+        # Every render in flight on a broken pool fails with it; only the first replaces it
+        if self._executor is executor:
+            # A worker died (e.g. OOM kill); replace the pool so later renders work
+            self._executor = self._new_executor()
+            self.counters["pool_restarts"] += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def start(self) -> None:
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = self._new_executor()
+        # Pay the interpreter start-up and reportlab import before the first request does
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)])
+        await loop.run_in_executor(self._executor, render_report_pdf, _WARM_UP_REPORT)
+        logging.info(f"Report render pool started with {self.workers} process(es)")
+
+    async def stop(self) -> None:
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def render(self, **kwargs: Any) -> bytes:
+        return await self._run(render_report_pdf, kwargs)
+
+    async def render_to_file(self, path: str, **kwargs: Any) -> int:
+        """Render to ``path`` (overwritten) and return the file size in bytes."""
+        return await self._run(render_report_file, kwargs, path)
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise RenderPoolSaturated(f"{self.pending} report(s) already rendering or queued")
+            self.pending += 1
+        if self._executor is None:
+            self._executor = self._new_executor()
+        executor = self._executor
+        start = time.perf_counter()
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BaseException:
+                self._release(None)
+                raise
+            # Released when the worker finishes, not when the caller stops waiting (e.g. client disconnect)
+            future.add_done_callback(self._release)
+            result = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            self.counters["failed"] += 1
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        self.counters["rendered"] += 1
+        self.render_ms.record((time.perf_counter() - start) * 1000)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "render": self.render_ms.stats(),
+            **self.counters,
+        }
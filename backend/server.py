@@ -1,4 +1,6 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -6,21 +8,45 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Tuple
 import uuid
 from datetime import datetime, timedelta
 import jwt
-from passlib.hash import bcrypt
 import asyncio
 import json
+import math
+import time
 import base64
+import csv
+import hmac
+import io
+import shutil
+import tempfile
+import zlib
 from io import BytesIO
 from PIL import Image
 
+try:
+    import orjson
+except ImportError:  # optional: only needed for FAST_JSON_RESPONSES
+    orjson = None
+
 # Database (MySQL, async)
 import aiomysql
 
 from health_scoring import compute_health_score
+from llm_providers import estimate_tokens, provider_from_env
+from llm_cache import LLMResponseCache, make_cache_key
+from llm_limiter import GeminiLimiter, LimiterSaturated
+from llm_metrics import LatencyWindow
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from llm_hedging import Hedger
+from task_queue import BackgroundTaskQueue, Job, PermanentJobError, QueueFull
+from chat_context import ChatContext, ChatContextCache, ContextSection, compile_context
+from chat_memory import ConversationMemory, MemorySnapshot, SUMMARY_SYSTEM_PROMPT
+from password_hasher import HasherSaturated, PasswordHasher
+from rate_limiter import BucketLimit, RateLimited, RateLimiter, bucket_store_from_env
+from compression import CompressionMiddleware, CompressionStats, choose_encoding
 
 # Google Gemini
 import google.generativeai as genai
@@ -34,6 +60,112 @@ GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# LLM_PROVIDER=fake swaps Gemini for a deterministic local stand-in (load tests, benchmarks)
+llm_provider = provider_from_env()
+# Keep fake responses out of cache entries that real Gemini answers would use
+LLM_CACHE_MODEL_KEY = GEMINI_MODEL if llm_provider.name == "gemini" else f"{llm_provider.name}:{GEMINI_MODEL}"
+
+# LLM response cache (see llm_cache.py). Only call sites listed in LLM_CACHE_TTLS are
+# cached; chat, symptom analysis, OCR and other personalised prompts always go upstream.
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH = Path(os.environ.get('LLM_CACHE_PATH', str(ROOT_DIR / '.cache' / 'llm_cache.sqlite3')))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get('LLM_CACHE_MEMORY_ENTRIES', '512'))
+LLM_CACHE_TTLS = {
+    'persona': 30 * 24 * 3600,
+    'challenge_feedback': 24 * 3600,
+    'insights': 6 * 3600,
+    'prescription_summary': 7 * 24 * 3600,
+}
+llm_cache = LLMResponseCache(LLM_CACHE_PATH, memory_entries=LLM_CACHE_MEMORY_ENTRIES)
+
+# Upstream concurrency limits (per worker process, see llm_limiter.py)
+gemini_limiter = GeminiLimiter(
+    max_in_flight=int(os.environ.get('GEMINI_MAX_IN_FLIGHT', '16')),
+    max_queue=int(os.environ.get('GEMINI_MAX_QUEUE', '64')),
+    queue_timeout=float(os.environ.get('GEMINI_QUEUE_TIMEOUT', '10')),
+    max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', '3')),
+)
+
+# Per-call-site deadlines in seconds, covering queueing, retries and the upstream call.
+# Handlers with a hard-coded fallback use it as soon as the deadline passes.
+GEMINI_DEFAULT_DEADLINE = float(os.environ.get('GEMINI_DEFAULT_DEADLINE', '20'))
+GEMINI_DEADLINES = {
+    'persona': 8,
+    'challenge_feedback': 5,
+    'insights': 8,
+    'symptom_analysis': 15,
+    'chat': 30,
+    'prescription_ocr': 30,
+    'prescription_analysis': 45,
+    'report_summary': 20,
+    'prescription_summary': 10,
+    'chat_summary': 20,
+}
+
+# Short, idempotent prompts that may be hedged: a second attempt is sent when the first
+# is slower than GEMINI_HEDGE_PERCENTILE of recent latency, within GEMINI_HEDGE_BUDGET.
+GEMINI_HEDGED_SITES = {'persona', 'challenge_feedback'}
+gemini_hedger = Hedger(
+    percentile=float(os.environ.get('GEMINI_HEDGE_PERCENTILE', '95')),
+    budget=float(os.environ.get('GEMINI_HEDGE_BUDGET', '0.05')),
+)
+
+# Opens after consecutive upstream failures; while open every Gemini call fails fast
+gemini_breaker = CircuitBreaker(
+    'gemini',
+    failure_threshold=int(os.environ.get('GEMINI_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.environ.get('GEMINI_BREAKER_RESET_SECONDS', '30')),
+)
+
+# Per-user and per-IP token buckets on the endpoints that call Gemini (see rate_limiter.py).
+# Each request costs RATE_LIMIT_COSTS[route] tokens from both buckets.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Behind N reverse proxies the client address is the Nth entry from the right of X-Forwarded-For
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+RATE_LIMIT_COSTS = {
+    'chat': 1,
+    'challenge_checkin': 1,
+    'bodymap': 2,
+    'prescription_upload': 5,
+    'report': 5,
+}
+rate_limiter = RateLimiter(
+    bucket_store_from_env(),
+    user_limit=BucketLimit(
+        per_minute=float(os.environ.get('RATE_LIMIT_USER_PER_MINUTE', '12')),
+        burst=float(os.environ.get('RATE_LIMIT_USER_BURST', '20')),
+    ),
+    ip_limit=BucketLimit(
+        per_minute=float(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '60')),
+        burst=float(os.environ.get('RATE_LIMIT_IP_BURST', '60')),
+    ),
+    costs=RATE_LIMIT_COSTS,
+)
+
+# Compiled chat system prompts, per user (see chat_context.py)
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', '800'))
+chat_context_cache = ChatContextCache(
+    max_users=int(os.environ.get('CHAT_CONTEXT_CACHE_USERS', '2048')),
+    ttl=float(os.environ.get('CHAT_CONTEXT_CACHE_TTL', '600')),
+)
+
+# Rolling chat memory: last K turns verbatim plus a summary refreshed every N messages
+chat_memory = ConversationMemory(
+    recent_turns=int(os.environ.get('CHAT_MEMORY_TURNS', '6')),
+    refresh_every=int(os.environ.get('CHAT_MEMORY_REFRESH_EVERY', '10')),
+)
+
+# AI enrichment (personas, check-in feedback, symptom analysis) runs after the
+# response has been sent; status and results are kept in ai_enrichments
+enrichment_queue = BackgroundTaskQueue(
+    workers=int(os.environ.get('ENRICHMENT_WORKERS', '4')),
+    max_pending=int(os.environ.get('ENRICHMENT_MAX_PENDING', '500')),
+    max_attempts=int(os.environ.get('ENRICHMENT_MAX_ATTEMPTS', '3')),
+)
+# Jobs live in memory only: a pending or running enrichment not updated for this long
+# was lost (e.g. to a restart or deploy) and is marked failed
+ENRICHMENT_STALE_SECONDS = int(os.environ.get('ENRICHMENT_STALE_SECONDS', '600'))
+
 # Note: Using Gemini Vision for OCR (FREE - no billing required!)
 
 # MySQL connection (async pool)
@@ -50,6 +182,13 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_DAYS = 30
 
+# Password hashing runs off the event loop; raising the rounds rehashes each account on its next login
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', '12')),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32')),
+)
+
 
 async def ensure_database_pool() -> aiomysql.Pool:
     """Create an aiomysql pool, creating the target database if it doesn't exist.
@@ -136,6 +275,54 @@ async def execute(query: str, params: tuple = ()) -> int:
             await conn.commit()
             return last_id
 
+async def execute_update(query: str, params: tuple = ()) -> int:
+    """Run an UPDATE/DELETE and return the number of rows it changed."""
+    if db_pool is None:
+        raise RuntimeError('Database pool is not initialized')
+    async with db_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            changed = await cur.execute(query, params)
+            await conn.commit()
+            return changed
+
+async def iter_rows(query: str, params: tuple = (), batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """Stream rows from an unbuffered server-side cursor, ``batch_size`` at a time.
+
+    Holds a pooled connection until the iterator is exhausted or closed. When
+    closed early (e.g. the client disconnected) the connection is dropped
+    instead of reading the rest of the result set.
+    """
+    if db_pool is None:
+        raise RuntimeError('Database pool is not initialized')
+    async with db_pool.acquire() as conn:
+        async with conn.cursor() as setup:
+            # The server waits on a slow reader for up to net_write_timeout before aborting.
+            # Raised for this stream only; put back before the connection returns to the pool
+            await setup.execute("SELECT @@SESSION.net_write_timeout")
+            (previous_timeout,) = await setup.fetchone()
+            await setup.execute("SET SESSION net_write_timeout = 600")
+        cur = await conn.cursor(aiomysql.SSDictCursor)
+        finished = False
+        try:
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+            finished = True
+        finally:
+            if finished:
+                await cur.close()
+                try:
+                    async with conn.cursor() as reset:
+                        await reset.execute("SET SESSION net_write_timeout = %s", (previous_timeout,))
+                except Exception:
+                    conn.close()
+            else:
+                conn.close()
+
 async def init_db(conn: aiomysql.Connection):
     async with conn.cursor() as cur:
         # users
@@ -165,12 +352,22 @@ async def init_db(conn: aiomysql.Connection):
                 existing_conditions TEXT NULL,
                 lifestyle_notes TEXT NULL,
                 health_persona TEXT NULL,
+                version INT NOT NULL DEFAULT 1,
                 created_at DATETIME NOT NULL,
                 updated_at DATETIME NOT NULL,
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
         )
+        # Bumped on every write so a background persona only lands on the save it was made for
+        await cur.execute(
+            """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema=DATABASE() AND table_name='health_profiles' AND column_name='version'
+            """
+        )
+        if not await cur.fetchone():
+            await cur.execute("ALTER TABLE health_profiles ADD COLUMN version INT NOT NULL DEFAULT 1")
         # timeline_entries
         await cur.execute(
             """
@@ -187,6 +384,17 @@ async def init_db(conn: aiomysql.Connection):
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
         )
+        # Per-type report log (ROW_NUMBER over entry_type); added separately so existing tables get it
+        await cur.execute(
+            """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema=DATABASE() AND table_name='timeline_entries' AND index_name='idx_timeline_user_type_ts'
+            """
+        )
+        if not await cur.fetchone():
+            await cur.execute(
+                "ALTER TABLE timeline_entries ADD INDEX idx_timeline_user_type_ts (user_id, entry_type, timestamp)"
+            )
         # chat_messages
         await cur.execute(
             """
@@ -276,6 +484,66 @@ async def init_db(conn: aiomysql.Connection):
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
         )
+        # chat_memory
+        await cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_memory (
+                user_id INT PRIMARY KEY,
+                summary LONGTEXT NOT NULL,
+                summarized_until_id INT NOT NULL,
+                updated_at DATETIME NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # user_data_versions (bumped on profile, timeline and prescription writes)
+        await cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_data_versions (
+                user_id INT PRIMARY KEY,
+                version INT NOT NULL,
+                updated_at DATETIME NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # report_jobs (active_user_id is set while queued or running; UNIQUE allows one such job per user)
+        await cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS report_jobs (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                active_user_id INT NULL UNIQUE,
+                status VARCHAR(16) NOT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                file_size BIGINT NULL,
+                error TEXT NULL,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL,
+                INDEX idx_report_jobs_user (user_id, created_at),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # ai_enrichments
+        await cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_enrichments (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                kind VARCHAR(64) NOT NULL,
+                target_id INT NOT NULL,
+                status VARCHAR(16) NOT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                result LONGTEXT NULL,
+                error TEXT NULL,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL,
+                INDEX idx_ai_enrichments_user (user_id, created_at),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
         await conn.commit()
 
 def to_dt(dt: datetime) -> datetime:
@@ -284,15 +552,191 @@ def to_dt(dt: datetime) -> datetime:
         return dt.replace(tzinfo=None)
     return dt
 
-async def gemini_generate(system_message: str, user_text: str) -> str:
+# System prompts shared by every request. Model handles for these are built once at startup.
+PERSONA_SYSTEM_PROMPT = "You are a creative health coach who creates fun, memorable health personas."
+CHALLENGE_COACH_SYSTEM_PROMPT = "You are an encouraging fitness coach. Give brief, motivating feedback."
+SYMPTOM_ADVISOR_SYSTEM_PROMPT = "You are a helpful health advisor. Provide general health information, not medical diagnosis."
+INSIGHTS_SYSTEM_PROMPT = "You are a health data analyst. Provide brief, actionable insights."
+PRESCRIPTION_ANALYSIS_SYSTEM_PROMPT = "You are an expert pharmacist who corrects OCR errors in prescription text and provides detailed medication guidance. Always return valid JSON."
+REPORT_SUMMARY_SYSTEM_PROMPT = "You are a medical professional creating a health summary for a patient report."
+PRESCRIPTION_SUMMARY_SYSTEM_PROMPT = "You are a concise clinical pharmacist summarizing prescriptions for a patient report."
+
+KNOWN_SYSTEM_PROMPTS = [
+    None,  # Gemini Vision OCR runs without a system instruction
+    PERSONA_SYSTEM_PROMPT,
+    CHALLENGE_COACH_SYSTEM_PROMPT,
+    SYMPTOM_ADVISOR_SYSTEM_PROMPT,
+    INSIGHTS_SYSTEM_PROMPT,
+    PRESCRIPTION_ANALYSIS_SYSTEM_PROMPT,
+    REPORT_SUMMARY_SYSTEM_PROMPT,
+    PRESCRIPTION_SUMMARY_SYSTEM_PROMPT,
+    SUMMARY_SYSTEM_PROMPT,
+]
+
+def gemini_deadline(site: Optional[str]) -> float:
+    return GEMINI_DEADLINES.get(site, GEMINI_DEFAULT_DEADLINE) if site else GEMINI_DEFAULT_DEADLINE
+
+async def call_gemini(
+    make_call: Callable[[float], Awaitable[Any]],
+    site: Optional[str] = None,
+    key: Optional[str] = None,
+) -> Any:
+    """Run one upstream Gemini call under the circuit breaker, limiter and the site's deadline.
+
+    ``make_call`` receives the deadline so it can also be passed to the SDK as
+    its request timeout. Raises CircuitOpen without calling upstream while the
+    breaker is open.
+    """
+    gemini_breaker.before_call()
+    deadline = gemini_deadline(site)
+    if site in GEMINI_HEDGED_SITES:
+        # The hedge shares its primary's limiter slot; the hedging budget bounds the extra load
+        attempt = lambda: gemini_hedger.run(site, lambda: make_call(deadline))
+    else:
+        attempt = lambda: make_call(deadline)
+    try:
+        result = await asyncio.wait_for(gemini_limiter.run(attempt, key=key), timeout=deadline)
+    except (LimiterSaturated, asyncio.CancelledError):
+        # Local back-pressure or a cancelled caller says nothing about upstream health
+        gemini_breaker.release_probe()
+        raise
+    except asyncio.TimeoutError:
+        gemini_breaker.record_failure()
+        raise TimeoutError(f"Gemini call for '{site or 'default'}' exceeded its {deadline:g}s deadline")
+    except Exception:
+        gemini_breaker.record_failure()
+        raise
+    gemini_breaker.record_success()
+    return result
+
+async def gemini_generate(
+    system_message: str,
+    user_text: str,
+    generation_config: Optional[Dict[str, Any]] = None,
+    site: Optional[str] = None,
+) -> str:
+    """Run a Gemini completion for the given call site.
+
+    ``site`` selects the deadline (GEMINI_DEADLINES) and, for prompts that are
+    fully determined by their inputs, the response cache TTL (LLM_CACHE_TTLS);
+    identical prompts are then answered from the cache until the TTL expires.
+    """
+    ttl = LLM_CACHE_TTLS.get(site) if (LLM_CACHE_ENABLED and site) else None
+    request_key = make_cache_key(LLM_CACHE_MODEL_KEY, system_message, user_text, generation_config)
+    if ttl:
+        cached = await llm_cache.get(request_key, site=site)
+        if cached is not None:
+            return cached
+
+    async def call(timeout: float) -> str:
+        return await llm_provider.generate(GEMINI_MODEL, system_message, user_text, generation_config, timeout)
+
     try:
-        model = genai.GenerativeModel(model_name=GEMINI_MODEL, system_instruction=system_message)
-        resp = await model.generate_content_async(user_text)
-        return (resp.text or "").strip()
+        # Identical prompts already in flight share one upstream request
+        text = await call_gemini(call, site=site, key=request_key)
+    except CircuitOpen:
+        raise
     except Exception as e:
         logging.error(f"Gemini error: {e}")
         raise
 
+    if ttl and text:
+        await llm_cache.set(request_key, text, ttl)
+    return text
+
+async def _user_data_changed(user_id: int) -> None:
+    """Call after writing a user's profile, timeline entries or prescriptions."""
+    chat_context_cache.invalidate(user_id)
+    # A new data version moves the user to a new report cache key
+    await execute(
+        """
+        INSERT INTO user_data_versions (user_id, version, updated_at) VALUES (%s, 1, %s)
+        ON DUPLICATE KEY UPDATE version=version+1, updated_at=VALUES(updated_at)
+        """,
+        (user_id, to_dt(datetime.utcnow())),
+    )
+
+async def _set_enrichment_status(
+    enrichment_id: int,
+    status_value: str,
+    attempts: int,
+    result: Optional[str] = None,
+    error: Optional[str] = None,
+) -> None:
+    await execute(
+        "UPDATE ai_enrichments SET status=%s, attempts=%s, result=%s, error=%s, updated_at=%s WHERE id=%s",
+        (status_value, attempts, result, error, to_dt(datetime.utcnow()), enrichment_id),
+    )
+
+async def _fail_stale_enrichments(enrichment_id: Optional[int] = None) -> int:
+    """Mark lost pending/running enrichments failed (one, or all of them); returns how many."""
+    now = datetime.utcnow()
+    query = """
+        UPDATE ai_enrichments SET status='failed', error=%s, updated_at=%s
+        WHERE status IN ('pending', 'running') AND updated_at < %s
+    """
+    params: tuple = (
+        "Interrupted before completion",
+        to_dt(now),
+        to_dt(now - timedelta(seconds=ENRICHMENT_STALE_SECONDS)),
+    )
+    if enrichment_id is not None:
+        query += " AND id=%s"
+        params += (enrichment_id,)
+    return await execute_update(query, params)
+
+async def enqueue_enrichment(
+    user_id: int,
+    kind: str,
+    target_id: int,
+    generate: Callable[[], Awaitable[str]],
+    apply: Callable[[str], Awaitable[bool]],
+) -> Dict[str, str]:
+    """Record a pending enrichment and schedule it on the background queue.
+
+    ``generate`` produces the AI text and ``apply`` writes it back to the
+    source row, returning False if the row has changed since the enrichment
+    was queued (the enrichment is then marked ``superseded``). Returns the id
+    and status to hand back to the client, which polls
+    GET /api/enrichments/{id} for the result.
+    """
+    now = to_dt(datetime.utcnow())
+    enrichment_id = await execute(
+        """
+        INSERT INTO ai_enrichments (user_id, kind, target_id, status, attempts, created_at, updated_at)
+        VALUES (%s, %s, %s, 'pending', 0, %s, %s)
+        """,
+        (user_id, kind, target_id, now, now),
+    )
+
+    async def run(attempt: int) -> None:
+        await _set_enrichment_status(enrichment_id, "running", attempt)
+        try:
+            text = await generate()
+            if not text:
+                raise ValueError("Empty response from Gemini")
+            applied = await apply(text)
+        except Exception as e:
+            await _set_enrichment_status(enrichment_id, "pending", attempt, error=str(e))
+            raise
+        if applied:
+            await _set_enrichment_status(enrichment_id, "done", attempt, result=text)
+        else:
+            await _set_enrichment_status(
+                enrichment_id, "superseded", attempt, error="Target changed before the result was saved"
+            )
+
+    async def on_failure(exc: BaseException, attempts: int) -> None:
+        await _set_enrichment_status(enrichment_id, "failed", attempts, error=str(exc))
+
+    try:
+        enrichment_queue.submit(Job(name=f"{kind}:{enrichment_id}", run=run, on_failure=on_failure))
+    except QueueFull as e:
+        logging.warning(f"Skipping {kind} enrichment: {e}")
+        await _set_enrichment_status(enrichment_id, "failed", 0, error=str(e))
+        return {"enrichment_id": str(enrichment_id), "enrichment_status": "failed"}
+    return {"enrichment_id": str(enrichment_id), "enrichment_status": "pending"}
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -337,6 +781,8 @@ class HealthProfileResponse(BaseModel):
     health_persona: Optional[str]
     created_at: datetime
     updated_at: datetime
+    enrichment_id: Optional[str] = None  # set while a new persona is being generated
+    enrichment_status: Optional[str] = None
 
 class TimelineEntryCreate(BaseModel):
     entry_type: str  # "symptom", "mood", "medicine", "sleep", "hydration", "note"
@@ -366,6 +812,26 @@ class ChatMessageResponse(BaseModel):
 class ChatHistoryResponse(BaseModel):
     messages: List[ChatMessageResponse]
 
+# ==================== FAST JSON RESPONSES ====================
+
+# List endpoints normally build one response model per row, which FastAPI then
+# validates and encodes again. With FAST_JSON_RESPONSES the row dicts, already in
+# the model's shape, go straight to orjson; the output is byte-for-byte the same
+# (see `python benchmarks.py fast-json`).
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() in ('1', 'true', 'yes') and orjson is not None
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+def _list_response(rows: List[Dict[str, Any]], fields: Callable[[Dict[str, Any]], Dict[str, Any]], model: Any) -> Any:
+    """``rows`` mapped through ``fields`` as a JSON list of ``model``."""
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse([fields(r) for r in rows])
+    return [model(**fields(r)) for r in rows]
+
 # ==================== AUTH HELPERS ====================
 
 def create_token(username: str) -> str:
@@ -375,6 +841,14 @@ def create_token(username: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def _password_hasher_busy(e: HasherSaturated) -> HTTPException:
+    logger.warning(f"Password hashing rejected: {e}")
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-ins right now, please try again shortly",
+        headers={"Retry-After": "2"},
+    )
+
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     try:
         token = credentials.credentials
@@ -388,6 +862,33 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def _client_ip(request: Request) -> Optional[str]:
+    if RATE_LIMIT_PROXY_HOPS > 0:
+        forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else None
+
+async def enforce_rate_limit(request: Request, username: str, route: str) -> None:
+    """Charge ``route`` to the user's and the client IP's buckets; 429 with Retry-After when either is empty."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    try:
+        await rate_limiter.check(route, username, _client_ip(request))
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please slow down",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+
+def rate_limited(route: str) -> Callable[..., Awaitable[str]]:
+    """Dependency: ``verify_token`` plus the rate limit for ``route``. Resolves to the username."""
+    async def dependency(request: Request, username: str = Depends(verify_token)) -> str:
+        await enforce_rate_limit(request, username, route)
+        return username
+    return dependency
+
 # ==================== AUTH ENDPOINTS ====================
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -398,7 +899,10 @@ async def register(user: UserRegister):
         raise HTTPException(status_code=400, detail="Username already exists")
 
     # Hash password
-    hashed_password = bcrypt.hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except HasherSaturated as e:
+        raise _password_hasher_busy(e)
 
     # Create user
     created_at = to_dt(datetime.utcnow())
@@ -420,9 +924,20 @@ async def login(user: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # Verify password
-    if not bcrypt.verify(user.password, user_doc["password_hash"]):
+    try:
+        valid, new_hash = await password_hasher.verify(user.password, user_doc["password_hash"])
+    except HasherSaturated as e:
+        raise _password_hasher_busy(e)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Stored with an older work factor: replace it now that we have the password
+    if new_hash:
+        try:
+            await execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, user_doc["id"]))
+        except Exception as e:
+            logger.warning(f"Could not rehash password for user {user_doc['id']}: {e}")
+
     # Create token
     token = create_token(user.username)
 
@@ -454,32 +969,24 @@ Based on this health profile, create a fun and engaging "health persona" in 1-2
 Make it playful and memorable, like "You're a Night Owl Strategist" or "You're a Zen Snacker".
 """
     
-    health_persona = "Health Warrior in Training"  # Default
-
-    try:
-        response = await gemini_generate(
-            "You are a creative health coach who creates fun, memorable health personas.",
-            persona_prompt,
-        )
-        if response:
-            health_persona = response
-    except Exception as e:
-        logging.error(f"Error generating persona: {e}")
-    
     # Check if profile exists
     existing_profile = await fetch_one(
         "SELECT * FROM health_profiles WHERE user_id=%s",
         (user_id,)
     )
 
+    # Keep the current persona until the background job replaces it
+    health_persona = (existing_profile or {}).get("health_persona") or "Health Warrior in Training"
+
     now = to_dt(datetime.utcnow())
     if existing_profile:
-        await execute(
+        # LAST_INSERT_ID(expr) hands the new version back as the statement's insert id
+        version = await execute(
             """
             UPDATE health_profiles
             SET sleep_pattern=%s, sleep_hours=%s, hydration_level=%s, stress_level=%s,
                 exercise_frequency=%s, diet_type=%s, existing_conditions=%s, lifestyle_notes=%s,
-                health_persona=%s, updated_at=%s
+                health_persona=%s, updated_at=%s, version=LAST_INSERT_ID(version + 1)
             WHERE user_id=%s
             """,
             (
@@ -526,6 +1033,23 @@ Make it playful and memorable, like "You're a Night Owl Strategist" or "You're a
         )
         profile_id = str(profile_id_int)
         updated_at = created_at
+        version = 1
+    await _user_data_changed(user_id)
+
+    async def generate_persona() -> str:
+        return await gemini_generate(PERSONA_SYSTEM_PROMPT, persona_prompt, site="persona")
+
+    async def apply_persona(text: str) -> bool:
+        # A newer save of the profile supersedes this persona
+        changed = await execute_update(
+            "UPDATE health_profiles SET health_persona=%s, version=version+1 WHERE id=%s AND version=%s",
+            (text, int(profile_id), version),
+        )
+        if changed:
+            await _user_data_changed(user_id)
+        return bool(changed)
+
+    enrichment = await enqueue_enrichment(user_id, "persona", int(profile_id), generate_persona, apply_persona)
 
     return HealthProfileResponse(
         id=profile_id,
@@ -541,6 +1065,7 @@ Make it playful and memorable, like "You're a Night Owl Strategist" or "You're a
         health_persona=health_persona,
         created_at=created_at,
         updated_at=updated_at,
+        **enrichment,
     )
 
 @api_router.get("/health/profile", response_model=Optional[HealthProfileResponse])
@@ -550,11 +1075,9 @@ async def get_health_profile(username: str = Depends(verify_token)):
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = int(user["id"])
-    profile = await fetch_one("SELECT * FROM health_profiles WHERE user_id=%s", (user_id,))
-
-    if not profile:
-        return None
+    return await _fetch_health_profile(user_id)
 
+def _health_profile_from_row(profile: Dict[str, Any]) -> HealthProfileResponse:
     return HealthProfileResponse(
         id=str(profile["id"]),
         user_id=str(profile["user_id"]),
@@ -571,6 +1094,12 @@ async def get_health_profile(username: str = Depends(verify_token)):
         updated_at=profile["updated_at"],
     )
 
+async def _fetch_health_profile(user_id: int) -> Optional[HealthProfileResponse]:
+    profile = await fetch_one("SELECT * FROM health_profiles WHERE user_id=%s", (user_id,))
+    if not profile:
+        return None
+    return _health_profile_from_row(profile)
+
 # ==================== TIMELINE ENDPOINTS ====================
 
 @api_router.post("/timeline/entry", response_model=TimelineEntryResponse)
@@ -601,6 +1130,7 @@ async def create_timeline_entry(
             ts,
         ),
     )
+    await _user_data_changed(user_id)
 
     return TimelineEntryResponse(
         id=str(new_id),
@@ -623,84 +1153,304 @@ async def get_timeline_entries(
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = int(user["id"])
+    rows = await _fetch_timeline_rows(user_id, limit)
+    return _list_response(rows, _timeline_entry_fields, TimelineEntryResponse)
 
-    rows = await fetch_all(
+def _timeline_entry_fields(r: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        tags = json.loads(r.get("tags") or "[]")
+    except Exception:
+        tags = []
+    return {
+        "id": str(r["id"]),
+        "user_id": str(r["user_id"]),
+        "entry_type": r["entry_type"],
+        "title": r["title"],
+        "description": r.get("description"),
+        "severity": r.get("severity"),
+        "tags": tags,
+        "timestamp": r["timestamp"],
+    }
+
+def _timeline_entry_from_row(r: Dict[str, Any]) -> TimelineEntryResponse:
+    return TimelineEntryResponse(**_timeline_entry_fields(r))
+
+async def _fetch_timeline_rows(user_id: int, limit: int) -> List[Dict[str, Any]]:
+    return await fetch_all(
         "SELECT * FROM timeline_entries WHERE user_id=%s ORDER BY timestamp DESC LIMIT %s",
         (user_id, int(limit)),
     )
-    results: List[TimelineEntryResponse] = []
-    for r in rows:
-        try:
-            tags = json.loads(r.get("tags") or "[]")
-        except Exception:
-            tags = []
-        results.append(
-            TimelineEntryResponse(
-                id=str(r["id"]),
-                user_id=str(r["user_id"]),
-                entry_type=r["entry_type"],
-                title=r["title"],
-                description=r.get("description"),
-                severity=r.get("severity"),
-                tags=tags,
-                timestamp=r["timestamp"],
-            )
-        )
-    return results
 
-# ==================== CHAT ENDPOINTS ====================
+async def _fetch_timeline_entries(user_id: int, limit: int) -> List[TimelineEntryResponse]:
+    return [_timeline_entry_from_row(r) for r in await _fetch_timeline_rows(user_id, limit)]
+
+# Each export holds a database connection for as long as the client keeps reading
+TIMELINE_EXPORT_MAX_CONCURRENT = int(os.environ.get('TIMELINE_EXPORT_MAX_CONCURRENT', '2'))
+TIMELINE_EXPORT_COLUMNS = ["id", "entry_type", "title", "description", "severity", "tags", "timestamp"]
+_timeline_exports_active = 0
+
+async def _timeline_export_chunks(
+    rows: AsyncIterator[Dict[str, Any]],
+    export_format: str,
+    compress: bool,
+    chunk_bytes: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """Encode rows as NDJSON or CSV, yielding chunks of about ``chunk_bytes`` (gzipped if ``compress``)."""
+    gzip_stream = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer is not None:
+        writer.writerow(TIMELINE_EXPORT_COLUMNS)
+
+    def take() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip_stream.compress(data) if gzip_stream is not None else data
 
-@api_router.post("/chat/message", response_model=ChatMessageResponse)
-async def send_chat_message(
-    message: ChatMessageCreate,
+    try:
+        async for row in rows:
+            try:
+                tags = json.loads(row.get("tags") or "[]")
+            except Exception:
+                tags = []
+            timestamp = row["timestamp"].isoformat() if isinstance(row.get("timestamp"), datetime) else row.get("timestamp")
+            if writer is not None:
+                writer.writerow([
+                    row["id"], row["entry_type"], row["title"], row.get("description") or "",
+                    "" if row.get("severity") is None else row["severity"], json.dumps(tags), timestamp,
+                ])
+            else:
+                buffer.write(json.dumps({
+                    "id": row["id"],
+                    "entry_type": row["entry_type"],
+                    "title": row["title"],
+                    "description": row.get("description"),
+                    "severity": row.get("severity"),
+                    "tags": tags,
+                    "timestamp": timestamp,
+                }))
+                buffer.write("\n")
+            if buffer.tell() >= chunk_bytes:
+                chunk = take()
+                if chunk:
+                    yield chunk
+        chunk = take()
+        if gzip_stream is not None:
+            chunk += gzip_stream.flush()
+        if chunk:
+            yield chunk
+    finally:
+        # Release the cursor (and its connection) even if the client went away mid-stream
+        close = getattr(rows, "aclose", None)
+        if close is not None:
+            await close()
+
+@api_router.get("/timeline/export")
+async def export_timeline(
+    request: Request,
+    format: str = "ndjson",
+    since: Optional[datetime] = None,
     username: str = Depends(verify_token)
 ):
+    """Stream the user's complete timeline, oldest first, as NDJSON or CSV.
+
+    Rows are read from a server-side cursor and written as they arrive, so
+    memory does not grow with the size of the history. The body is gzipped
+    when the client's Accept-Encoding allows gzip.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
     user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = int(user["id"])
 
-    # Get user's health profile for context
-    profile = await fetch_one("SELECT * FROM health_profiles WHERE user_id=%s", (user_id,))
+    global _timeline_exports_active
+    if _timeline_exports_active >= TIMELINE_EXPORT_MAX_CONCURRENT:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports are running right now, please try again shortly",
+            headers={"Retry-After": "10"},
+        )
 
-    # Get recent timeline entries for context
-    recent_entries = await fetch_all(
-        "SELECT entry_type, title FROM timeline_entries WHERE user_id=%s ORDER BY timestamp DESC LIMIT 10",
-        (user_id,),
-    )
-    
-    # Build context
-    context = "You are a helpful health assistant."
-    if profile:
-        context += f"\n\nUser's Health Profile:\n"
-        context += f"- Persona: {profile.get('health_persona', 'N/A')}\n"
-        context += f"- Sleep: {profile.get('sleep_pattern')} ({profile.get('sleep_hours')}h)\n"
-        context += f"- Stress: {profile.get('stress_level')}\n"
-        context += f"- Exercise: {profile.get('exercise_frequency')}\n"
-    
-    if recent_entries:
-        context += "\n\nRecent Health Timeline:\n"
-        for entry in recent_entries[:5]:
-            context += f"- {entry.get('entry_type')}: {entry.get('title')}\n"
-    # Include recent prescriptions in chat context so assistant can reference them
+    # id order follows insertion order and is read straight from the user_id index, without a sort
+    query = "SELECT id, entry_type, title, description, severity, tags, timestamp FROM timeline_entries WHERE user_id=%s"
+    params: tuple = (user_id,)
+    if since is not None:
+        query += " AND timestamp >= %s"
+        params += (to_dt(since),)
+    query += " ORDER BY id"
+
+    compress = choose_encoding(request.headers.get("accept-encoding", ""), brotli_available=False) == "gzip"
+    headers = {
+        "Content-Disposition": f"attachment; filename=timeline_{username}_{datetime.now().strftime('%Y%m%d')}.{format}",
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    # Taken here, with no await since the check above, rather than when streaming starts:
+    # otherwise a burst of requests would all pass the check before any of them counted
+    _timeline_exports_active += 1
+    released = False
+
+    def release_slot() -> None:
+        global _timeline_exports_active
+        nonlocal released
+        if not released:
+            released = True
+            _timeline_exports_active -= 1
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in _timeline_export_chunks(iter_rows(query, params), format, compress):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Timeline export for user {user_id} failed mid-stream: {e}")
+            raise
+        finally:
+            release_slot()
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    try:
+        # The background task frees the slot if the body is never iterated (e.g. the client left first)
+        return StreamingResponse(
+            body(), media_type=media_type, headers=headers, background=BackgroundTask(release_slot)
+        )
+    except Exception:
+        release_slot()
+        raise
+
+# ==================== CHAT ENDPOINTS ====================
+
+async def _recent_prescriptions_for_context(user_id: int) -> List[Dict[str, Any]]:
     try:
-        recent_pres = await fetch_all(
-            "SELECT medication_name, dosage, frequency, timing, personalized_advice FROM prescriptions WHERE user_id=%s ORDER BY created_at DESC LIMIT 5",
+        return await fetch_all(
+            "SELECT medication_name, dosage, frequency, timing FROM prescriptions WHERE user_id=%s ORDER BY created_at DESC LIMIT 5",
             (user_id,)
         )
-        if recent_pres:
-            context += "\n\nRecent Prescriptions:\n"
-            for p in recent_pres:
-                med = p.get('medication_name') or 'Unknown'
-                dosage = p.get('dosage') or ''
-                freq = p.get('frequency') or p.get('timing') or ''
-                context += f"- {med}: {dosage} {freq}\n"
-            context += "\nWhen relevant, you may reference these prescriptions and suggest actions like 'take this medicine from your prescription' while reminding the user to follow doctor's instructions."
     except Exception:
         # Non-fatal: continue without prescriptions
-        pass
-    
+        return []
+
+async def _compile_chat_context(user_id: int) -> ChatContext:
+    """System prompt for the chat assistant: profile, recent prescriptions and timeline."""
+    profile, recent_entries, recent_pres = await asyncio.gather(
+        fetch_one(
+            "SELECT health_persona, sleep_pattern, sleep_hours, stress_level, exercise_frequency FROM health_profiles WHERE user_id=%s",
+            (user_id,),
+        ),
+        fetch_all(
+            "SELECT entry_type, title FROM timeline_entries WHERE user_id=%s ORDER BY timestamp DESC LIMIT 5",
+            (user_id,),
+        ),
+        _recent_prescriptions_for_context(user_id),
+    )
+
+    # Sections in priority order; the timeline is trimmed first when over budget
+    sections = []
+    if profile:
+        sections.append(ContextSection("User's Health Profile", [
+            f"Persona: {profile.get('health_persona', 'N/A')}",
+            f"Sleep: {profile.get('sleep_pattern')} ({profile.get('sleep_hours')}h)",
+            f"Stress: {profile.get('stress_level')}",
+            f"Exercise: {profile.get('exercise_frequency')}",
+        ]))
+    if recent_pres:
+        # Include recent prescriptions in chat context so assistant can reference them
+        sections.append(ContextSection(
+            "Recent Prescriptions",
+            [
+                f"{p.get('medication_name') or 'Unknown'}: {p.get('dosage') or ''} {p.get('frequency') or p.get('timing') or ''}"
+                for p in recent_pres
+            ],
+            footer="When relevant, you may reference these prescriptions and suggest actions like 'take this medicine from your prescription' while reminding the user to follow doctor's instructions.",
+        ))
+    if recent_entries:
+        sections.append(ContextSection(
+            "Recent Health Timeline",
+            [f"{entry.get('entry_type')}: {entry.get('title')}" for entry in recent_entries],
+        ))
+    return compile_context("You are a helpful health assistant.", sections, CHAT_CONTEXT_TOKEN_BUDGET)
+
+async def _build_chat_context(user_id: int) -> str:
+    """Cached chat system prompt; dropped on writes to the profile, timeline or prescriptions."""
+    compiled = await chat_context_cache.get(user_id, _compile_chat_context)
+    return compiled.text
+
+async def _load_chat_memory(user_id: int) -> MemorySnapshot:
+    summary_row, recent = await asyncio.gather(
+        fetch_one("SELECT summary, summarized_until_id FROM chat_memory WHERE user_id=%s", (user_id,)),
+        fetch_all(
+            """
+            SELECT id, role, content FROM chat_messages
+            WHERE user_id=%s AND id > COALESCE((SELECT summarized_until_id FROM chat_memory WHERE user_id=%s), 0)
+            ORDER BY id DESC LIMIT %s
+            """,
+            (user_id, user_id, chat_memory.fetch_limit),
+        ),
+    )
+    return chat_memory.snapshot(summary_row, recent)
+
+# Users with a summary refresh queued, so each user has at most one in flight
+_chat_summaries_pending: set = set()
+
+def _schedule_chat_summary(user_id: int, snapshot: MemorySnapshot) -> None:
+    if not snapshot.needs_refresh or user_id in _chat_summaries_pending:
+        return
+
+    async def refresh(attempt: int) -> None:
+        row = await fetch_one("SELECT summary, summarized_until_id FROM chat_memory WHERE user_id=%s", (user_id,))
+        since_id = int(row["summarized_until_id"]) if row else 0
+        messages = await fetch_all(
+            "SELECT id, role, content FROM chat_messages WHERE user_id=%s AND id > %s AND id <= %s ORDER BY id ASC LIMIT 200",
+            (user_id, since_id, snapshot.refresh_until_id),
+        )
+        if messages:
+            summary = await gemini_generate(
+                SUMMARY_SYSTEM_PROMPT,
+                chat_memory.summary_prompt(row["summary"] if row else None, messages),
+                site="chat_summary",
+            )
+            if not summary:
+                raise ValueError("Empty summary from Gemini")
+            await execute(
+                """
+                INSERT INTO chat_memory (user_id, summary, summarized_until_id, updated_at) VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE summary=VALUES(summary), summarized_until_id=VALUES(summarized_until_id), updated_at=VALUES(updated_at)
+                """,
+                (user_id, summary, int(messages[-1]["id"]), to_dt(datetime.utcnow())),
+            )
+            logging.info(f"Chat summary for user {user_id} now covers {len(messages)} more message(s), {estimate_tokens(summary)} tokens")
+        _chat_summaries_pending.discard(user_id)
+
+    async def give_up(exc: BaseException, attempts: int) -> None:
+        _chat_summaries_pending.discard(user_id)
+
+    try:
+        enrichment_queue.submit(Job(name=f"chat_summary:{user_id}", run=refresh, on_failure=give_up))
+        _chat_summaries_pending.add(user_id)
+    except QueueFull as e:
+        logging.warning(f"Chat summary for user {user_id} deferred: {e}")
+
+@api_router.post("/chat/message", response_model=ChatMessageResponse)
+async def send_chat_message(
+    message: ChatMessageCreate,
+    username: str = Depends(rate_limited("chat"))
+):
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_id = int(user["id"])
+
+    # Memory is loaded before the new message is saved so it is not repeated in the prompt
+    context, memory = await asyncio.gather(_build_chat_context(user_id), _load_chat_memory(user_id))
+    prompt = chat_memory.render_prompt(memory, message.message)
+
     # Save user message
     user_ts = to_dt(datetime.utcnow())
     await execute(
@@ -710,7 +1460,11 @@ async def send_chat_message(
     
     # Get AI response
     try:
-        response = await gemini_generate(context, message.message)
+        response = await gemini_generate(context, prompt, site="chat")
+        logging.info(
+            f"Chat tokens for user {user_id}: {chat_memory.token_counts(context, memory, prompt)}, "
+            f"response={estimate_tokens(response)}"
+        )
 
         # Save assistant message
         assistant_ts = to_dt(datetime.utcnow())
@@ -719,15 +1473,118 @@ async def send_chat_message(
             (user_id, "assistant", response, assistant_ts),
         )
 
+        _schedule_chat_summary(user_id, memory)
+
         return ChatMessageResponse(
             role="assistant",
             content=response,
             timestamp=assistant_ts,
         )
+    except (LimiterSaturated, CircuitOpen):
+        raise HTTPException(status_code=503, detail="The assistant is busy right now, please try again shortly")
     except Exception as e:
         logging.error(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail="Failed to get AI response")
 
+# Time from request to first streamed token, and to stream completion
+chat_stream_ttft = LatencyWindow()
+chat_stream_total = LatencyWindow()
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@api_router.post("/chat/message/stream")
+async def stream_chat_message(
+    message: ChatMessageCreate,
+    request: Request,
+    username: str = Depends(rate_limited("chat"))
+):
+    """Server-Sent Events variant of /chat/message.
+
+    Emits ``token`` events as Gemini produces text, then a single ``done``
+    event with the assembled message once it has been saved. If the client
+    disconnects, the upstream stream is closed and nothing is persisted.
+    """
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_id = int(user["id"])
+
+    context, memory = await asyncio.gather(_build_chat_context(user_id), _load_chat_memory(user_id))
+    prompt = chat_memory.render_prompt(memory, message.message)
+
+    user_ts = to_dt(datetime.utcnow())
+    await execute(
+        "INSERT INTO chat_messages (user_id, role, content, timestamp) VALUES (%s, %s, %s, %s)",
+        (user_id, "user", message.message, user_ts),
+    )
+
+    started = time.perf_counter()
+
+    async def event_stream():
+        parts: List[str] = []
+        upstream = None
+        completed = False
+        ttft_ms: Optional[float] = None
+        try:
+            gemini_breaker.before_call()
+            async with gemini_limiter.slot():
+                upstream = llm_provider.stream(GEMINI_MODEL, context, prompt, gemini_deadline("chat"))
+                async for text in upstream:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        chat_stream_ttft.record(ttft_ms)
+                    parts.append(text)
+                    yield _sse_event("token", {"text": text})
+                    if await request.is_disconnected():
+                        logging.info(f"Chat stream client disconnected for user {user_id}")
+                        gemini_breaker.release_probe()
+                        return
+                completed = True
+            gemini_breaker.record_success()
+
+            content = "".join(parts).strip()
+            assistant_ts = to_dt(datetime.utcnow())
+            await execute(
+                "INSERT INTO chat_messages (user_id, role, content, timestamp) VALUES (%s, %s, %s, %s)",
+                (user_id, "assistant", content, assistant_ts),
+            )
+            chat_stream_total.record((time.perf_counter() - started) * 1000)
+            logging.info(
+                f"Chat tokens for user {user_id}: {chat_memory.token_counts(context, memory, prompt)}, "
+                f"response={estimate_tokens(content)}"
+            )
+            _schedule_chat_summary(user_id, memory)
+            yield _sse_event("done", {
+                "role": "assistant",
+                "content": content,
+                "timestamp": assistant_ts.isoformat(),
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+            })
+        except (LimiterSaturated, CircuitOpen) as e:
+            if isinstance(e, LimiterSaturated):
+                gemini_breaker.release_probe()
+            yield _sse_event("error", {"detail": "The assistant is busy right now, please try again shortly"})
+        except asyncio.CancelledError:
+            logging.info(f"Chat stream cancelled for user {user_id}")
+            gemini_breaker.release_probe()
+            raise
+        except Exception as e:
+            if not completed:
+                gemini_breaker.record_failure()
+            logging.error(f"Error in streaming chat: {e}")
+            yield _sse_event("error", {"detail": "Failed to get AI response"})
+        finally:
+            if upstream is not None and not completed:
+                await upstream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @api_router.get("/chat/history", response_model=ChatHistoryResponse)
 async def get_chat_history(
     limit: int = 50,
@@ -854,40 +1711,46 @@ async def get_active_challenges(username: str = Depends(verify_token)):
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = int(user["id"])
+    rows = await _fetch_active_challenge_rows(user_id)
+    return _list_response(rows, _challenge_fields, ChallengeResponse)
 
-    rows = await fetch_all(
-        "SELECT * FROM challenges WHERE user_id=%s AND is_active=1",
-        (user_id,),
-    )
-    results: List[ChallengeResponse] = []
-    for c in rows:
-        try:
-            badges = json.loads(c.get("badges") or "[]")
-        except Exception:
-            badges = []
-        results.append(
-            ChallengeResponse(
-                id=str(c["id"]),
-                user_id=str(c["user_id"]),
-                challenge_type=c["challenge_type"],
-                duration_days=c["duration_days"],
-                title=c["title"],
-                description=c["description"],
-                start_date=c["start_date"],
-                end_date=c["end_date"],
-                completed_days=c["completed_days"],
-                is_active=bool(c["is_active"]),
-                is_completed=bool(c["is_completed"]),
-                badges=badges,
-                created_at=c["created_at"],
-            )
-        )
-    return results
+def _challenge_fields(c: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        badges = json.loads(c.get("badges") or "[]")
+    except Exception:
+        badges = []
+    return {
+        "id": str(c["id"]),
+        "user_id": str(c["user_id"]),
+        "challenge_type": c["challenge_type"],
+        "duration_days": c["duration_days"],
+        "title": c["title"],
+        "description": c["description"],
+        "start_date": c["start_date"],
+        "end_date": c["end_date"],
+        "completed_days": c["completed_days"],
+        "is_active": bool(c["is_active"]),
+        "is_completed": bool(c["is_completed"]),
+        "badges": badges,
+        "created_at": c["created_at"],
+    }
+
+def _challenge_from_row(c: Dict[str, Any]) -> ChallengeResponse:
+    return ChallengeResponse(**_challenge_fields(c))
+
+async def _fetch_active_challenge_rows(user_id: int) -> List[Dict[str, Any]]:
+    return await fetch_all(
+        "SELECT * FROM challenges WHERE user_id=%s AND is_active=1",
+        (user_id,),
+    )
+
+async def _fetch_active_challenges(user_id: int) -> List[ChallengeResponse]:
+    return [_challenge_from_row(c) for c in await _fetch_active_challenge_rows(user_id)]
 
 @api_router.post("/challenges/checkin")
 async def challenge_checkin(
     checkin: ChallengeCheckIn,
-    username: str = Depends(verify_token)
+    username: str = Depends(rate_limited("challenge_checkin"))
 ):
     user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
     if not user:
@@ -951,27 +1814,39 @@ async def challenge_checkin(
         ),
     )
     
-    # Generate AI feedback
-    try:
-        prompt = (
-            f"User completed day {completed_days} of {challenge['duration_days']} in their {challenge['title']} "
-            f"challenge. Give them a brief motivating message (1-2 sentences)."
-        )
-        feedback = await gemini_generate(
-            "You are an encouraging fitness coach. Give brief, motivating feedback.",
-            prompt,
+    # AI feedback is generated in the background and stored on the check-in
+    prompt = (
+        f"User completed day {completed_days} of {challenge['duration_days']} in their {challenge['title']} "
+        f"challenge. Give them a brief motivating message (1-2 sentences)."
+    )
+    check_in_index = len(check_ins) - 1
+    check_in_path = f"$[{check_in_index}].ai_feedback"
+
+    async def generate_feedback() -> str:
+        return await gemini_generate(CHALLENGE_COACH_SYSTEM_PROMPT, prompt, site="challenge_feedback")
+
+    async def apply_feedback(text: str) -> bool:
+        # Only onto this check-in, and only once (a concurrent check-in may have rewritten the list)
+        changed = await execute_update(
+            """
+            UPDATE challenges SET check_ins=JSON_SET(check_ins, %s, %s)
+            WHERE id=%s AND JSON_UNQUOTE(JSON_EXTRACT(check_ins, %s))=%s AND JSON_EXTRACT(check_ins, %s) IS NULL
+            """,
+            (check_in_path, text, challenge_id_int, f"$[{check_in_index}].date", check_in_data["date"], check_in_path),
         )
-        if not feedback:
-            feedback = "Great job! Keep up the momentum!"
-    except Exception:
-        feedback = "Great job! Keep up the momentum!"
+        return bool(changed)
+
+    enrichment = await enqueue_enrichment(
+        user_id, "challenge_feedback", challenge_id_int, generate_feedback, apply_feedback
+    )
     
     return {
         "success": True,
         "completed_days": completed_days,
         "badges": badges,
         "is_completed": is_completed,
-        "ai_feedback": feedback
+        "ai_feedback": None,  # filled in by the enrichment; poll GET /api/enrichments/{enrichment_id}
+        **enrichment,
     }
 
 # ==================== BODY MAP ENDPOINTS ====================
@@ -984,7 +1859,7 @@ class BodyMapSymptom(BaseModel):
 @api_router.post("/bodymap/analyze")
 async def analyze_symptom(
     symptom: BodyMapSymptom,
-    username: str = Depends(verify_token)
+    username: str = Depends(rate_limited("bodymap"))
 ):
     user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
     if not user:
@@ -1013,8 +1888,7 @@ async def analyze_symptom(
         for s in recent_symptoms[:3]:
             context += f"{s.get('title')}, "
     
-    try:
-        prompt = f"""Based on this information: {context}
+    prompt = f"""Based on this information: {context}
 
 Provide:
 1. Possible causes (2-3 common reasons)
@@ -1023,26 +1897,37 @@ Provide:
 
 Keep it concise and easy to understand. Remember this is general information, not medical advice."""
 
-        analysis = await gemini_generate(
-            "You are a helpful health advisor. Provide general health information, not medical diagnosis.",
-            prompt,
-        )
-
-        # Save to database
+    try:
+        # Save to database; the analysis is filled in by the background job
         ts = to_dt(datetime.utcnow())
-        await execute(
+        entry_id = await execute(
             """
             INSERT INTO body_map_entries (user_id, body_part, pain_level, description, analysis, timestamp)
             VALUES (%s, %s, %s, %s, %s, %s)
             """,
-            (user_id, symptom.body_part, symptom.pain_level, symptom.description, analysis, ts),
+            (user_id, symptom.body_part, symptom.pain_level, symptom.description, "", ts),
+        )
+
+        async def generate_analysis() -> str:
+            return await gemini_generate(SYMPTOM_ADVISOR_SYSTEM_PROMPT, prompt, site="symptom_analysis")
+
+        async def apply_analysis(text: str) -> bool:
+            changed = await execute_update(
+                "UPDATE body_map_entries SET analysis=%s WHERE id=%s AND analysis=''", (text, entry_id)
+            )
+            return bool(changed)
+
+        enrichment = await enqueue_enrichment(
+            user_id, "symptom_analysis", entry_id, generate_analysis, apply_analysis
         )
 
         return {
             "body_part": symptom.body_part,
-            "analysis": analysis,
+            "analysis": None,
             "affected_areas": [symptom.body_part],  # Could expand to related areas
             "severity": "high" if symptom.pain_level >= 4 else "moderate" if symptom.pain_level >= 2 else "low",
+            "entry_id": str(entry_id),
+            **enrichment,
         }
     except Exception as e:
         logging.error(f"Error analyzing symptom: {e}")
@@ -1051,19 +1936,6 @@ Keep it concise and easy to understand. Remember this is general information, no
 # ==================== INSIGHTS ENDPOINTS ====================
 
 
-async def _get_recent_timeline_entries(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
-    since = to_dt(datetime.utcnow() - timedelta(days=days))
-    return await fetch_all(
-        "SELECT * FROM timeline_entries WHERE user_id=%s AND timestamp >= %s ORDER BY timestamp DESC",
-        (user_id, since),
-    )
-
-
-async def _build_health_score_from_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
-    breakdown = compute_health_score(entries)
-    return {"score": breakdown.score, "label": breakdown.label, "reason": breakdown.reason}
-
-
 @api_router.get("/insights/patterns")
 async def get_health_patterns(username: str = Depends(verify_token)):
     user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
@@ -1071,14 +1943,11 @@ async def get_health_patterns(username: str = Depends(verify_token)):
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = int(user["id"])
+    return await _build_health_patterns(user_id)
 
-    # Get timeline entries from last 30 days for general stats
-    thirty_days_ago = to_dt(datetime.utcnow() - timedelta(days=30))
-    entries = await fetch_all(
-        "SELECT * FROM timeline_entries WHERE user_id=%s AND timestamp >= %s",
-        (user_id, thirty_days_ago),
-    )
 
+def _health_pattern_stats(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Deterministic 30-day pattern counts; ``entries`` are the last 30 days of timeline rows."""
     # Analyze patterns
     symptom_count = sum(1 for e in entries if e["entry_type"] == "symptom")
     mood_entries = [e for e in entries if e["entry_type"] == "mood"]
@@ -1110,40 +1979,134 @@ async def get_health_patterns(username: str = Depends(verify_token)):
 
     # Remove any days that also had stressed moods
     stress_free_days = len(stress_free_dates - stressed_dates)
-    
+
+    return {
+        "total_entries": len(entries),
+        "symptoms_this_month": symptom_count,
+        "mood_entries": len(mood_entries),
+        "sleep_entries": len(sleep_entries),
+        "stress_free_days": stress_free_days,
+        "hydration_logs": len(hydration_entries),
+        "trends": {
+            "symptom_trend": "increasing" if symptom_count > 10 else "stable",
+            "hydration_trend": "good" if len(hydration_entries) > 15 else "needs_improvement",
+        },
+    }
+
+def _entries_since(entries: List[Dict[str, Any]], days: int) -> List[Dict[str, Any]]:
+    since = to_dt(datetime.utcnow() - timedelta(days=days))
+    return [e for e in entries if isinstance(e.get("timestamp"), datetime) and e["timestamp"] >= since]
+
+def _health_score_from_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Health score from the last 7 days of the given timeline rows."""
+    breakdown = compute_health_score(_entries_since(entries, 7))
+    return {"score": breakdown.score, "label": breakdown.label, "reason": breakdown.reason}
+
+async def _generate_pattern_insights(stats: Dict[str, Any]) -> str:
     # Generate AI insights (30-day patterns)
     try:
         prompt = f"""Analyze this health data from the last 30 days:
-- Symptoms logged: {symptom_count}
-- Mood entries: {len(mood_entries)}
-- Sleep tracking: {len(sleep_entries)}
-- Hydration logs: {len(hydration_entries)}
+- Symptoms logged: {stats["symptoms_this_month"]}
+- Mood entries: {stats["mood_entries"]}
+- Sleep tracking: {stats["sleep_entries"]}
+- Hydration logs: {stats["hydration_logs"]}
 
 Provide 2-3 brief, actionable insights or predictions. Be encouraging but realistic."""
-        ai_insights = await gemini_generate(
-            "You are a health data analyst. Provide brief, actionable insights.",
+        return await gemini_generate(
+            INSIGHTS_SYSTEM_PROMPT,
             prompt,
+            site="insights",
         )
     except Exception:
-        ai_insights = "Keep tracking your health to see patterns!"
+        return "Keep tracking your health to see patterns!"
 
-    # Compute AI health score from last 7 days of logs
-    recent_entries = await _get_recent_timeline_entries(user_id, days=7)
-    ai_health_score = await _build_health_score_from_entries(recent_entries)
+async def _build_health_patterns(user_id: int) -> Dict[str, Any]:
+    # Get timeline entries from last 30 days; the 7-day score window is a subset of them
+    thirty_days_ago = to_dt(datetime.utcnow() - timedelta(days=30))
+    entries = await fetch_all(
+        "SELECT * FROM timeline_entries WHERE user_id=%s AND timestamp >= %s",
+        (user_id, thirty_days_ago),
+    )
+
+    stats = _health_pattern_stats(entries)
+    ai_insights = await _generate_pattern_insights(stats)
 
     return {
-        "total_entries": len(entries),
-        "symptoms_this_month": symptom_count,
-        "stress_free_days": stress_free_days,
-        "hydration_logs": len(hydration_entries),
+        "total_entries": stats["total_entries"],
+        "symptoms_this_month": stats["symptoms_this_month"],
+        "stress_free_days": stats["stress_free_days"],
+        "hydration_logs": stats["hydration_logs"],
         "ai_insights": ai_insights,
-        "trends": {
-            "symptom_trend": "increasing" if symptom_count > 10 else "stable",
-            "hydration_trend": "good" if len(hydration_entries) > 15 else "needs_improvement",
-        },
-        "ai_health_score": ai_health_score,
+        "trends": stats["trends"],
+        # Compute AI health score from last 7 days of logs
+        "ai_health_score": _health_score_from_entries(entries),
     }
 
+# ==================== HOME DASHBOARD ENDPOINT ====================
+
+class HomeDashboardResponse(BaseModel):
+    entries: List[TimelineEntryResponse]
+    insights: Optional[Dict[str, Any]]
+    profile: Optional[HealthProfileResponse]
+    challenges: List[ChallengeResponse]
+
+
+async def _timed_stage(name: str, coro, timings: Dict[str, float]) -> Any:
+    """Await ``coro`` and record its duration in ``timings`` (milliseconds)."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000
+
+
+def _server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
+
+
+async def _timed_section(name: str, coro, timings: Dict[str, float], default: Any = None) -> Any:
+    """Await one dashboard section, recording its duration and isolating failures."""
+    try:
+        return await _timed_stage(name, coro, timings)
+    except Exception as e:
+        logging.error(f"Home dashboard section '{name}' failed: {e}")
+        return default
+
+
+@api_router.get("/home", response_model=HomeDashboardResponse)
+async def get_home_dashboard(
+    response: Response,
+    entries_limit: int = 5,
+    username: str = Depends(verify_token)
+):
+    """Everything the home screen needs in one round trip.
+
+    The user is resolved once and each section runs concurrently on its own pool
+    connection. Per-section durations are reported in the Server-Timing header.
+    """
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_id = int(user["id"])
+
+    timings: Dict[str, float] = {}
+    entries, insights, profile, challenges = await asyncio.gather(
+        _timed_section("entries", _fetch_timeline_entries(user_id, entries_limit), timings, []),
+        _timed_section("insights", _build_health_patterns(user_id), timings),
+        _timed_section("profile", _fetch_health_profile(user_id), timings),
+        _timed_section("challenges", _fetch_active_challenges(user_id), timings, []),
+    )
+
+    response.headers["Server-Timing"] = _server_timing(timings)
+
+    return HomeDashboardResponse(
+        entries=entries,
+        insights=insights,
+        profile=profile,
+        challenges=challenges,
+    )
+
 # ==================== REMINDERS ENDPOINTS ====================
 
 class ReminderCreate(BaseModel):
@@ -1216,22 +2179,20 @@ async def get_active_reminders(username: str = Depends(verify_token)):
         "SELECT * FROM reminders WHERE user_id=%s AND is_active=1",
         (user_id,),
     )
-    results: List[ReminderResponse] = []
-    for r in rows:
-        results.append(
-            ReminderResponse(
-                id=str(r["id"]),
-                user_id=str(r["user_id"]),
-                reminder_type=r["reminder_type"],
-                frequency_hours=r["frequency_hours"],
-                message=r["message"],
-                is_sarcastic=bool(r["is_sarcastic"]),
-                is_active=bool(r["is_active"]),
-                last_sent=r.get("last_sent"),
-                created_at=r["created_at"],
-            )
-        )
-    return results
+    return _list_response(rows, _reminder_fields, ReminderResponse)
+
+def _reminder_fields(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(r["id"]),
+        "user_id": str(r["user_id"]),
+        "reminder_type": r["reminder_type"],
+        "frequency_hours": r["frequency_hours"],
+        "message": r["message"],
+        "is_sarcastic": bool(r["is_sarcastic"]),
+        "is_active": bool(r["is_active"]),
+        "last_sent": r.get("last_sent"),
+        "created_at": r["created_at"],
+    }
 
 @api_router.post("/reminders/{reminder_id}/toggle")
 async def toggle_reminder(
@@ -1291,16 +2252,6 @@ async def extract_text_from_image(image_data: bytes) -> str:
         image_base64 = base64.b64encode(image_data).decode('utf-8')
         
         # Use Gemini with vision capabilities to extract text
-        model = genai.GenerativeModel(model_name=GEMINI_MODEL)
-        
-        # Create the image part
-        image_parts = [
-            {
-                "mime_type": "image/jpeg",  # Adjust if needed
-                "data": image_base64
-            }
-        ]
-        
         prompt = """Extract ALL text from this prescription image exactly as written. 
 Include:
 - Medication names
@@ -1311,9 +2262,10 @@ Include:
 
 Return ONLY the extracted text, nothing else."""
         
-        response = await model.generate_content_async([prompt, {"inline_data": {"mime_type": "image/jpeg", "data": image_base64}}])
-        
-        extracted_text = response.text.strip()
+        extracted_text = await call_gemini(
+            lambda timeout: llm_provider.generate_from_image(GEMINI_MODEL, prompt, image_base64, "image/jpeg", timeout),
+            site="prescription_ocr",
+        )
         
         if not extracted_text or len(extracted_text) < 10:
             raise HTTPException(
@@ -1324,6 +2276,8 @@ Return ONLY the extracted text, nothing else."""
         logging.info(f"✅ Successfully extracted {len(extracted_text)} characters using Gemini Vision")
         return extracted_text
         
+    except (LimiterSaturated, CircuitOpen):
+        raise HTTPException(status_code=503, detail="Text extraction is busy right now, please try again shortly")
     except Exception as e:
         logging.error(f"❌ Error extracting text from image: {e}")
         raise HTTPException(
@@ -1385,8 +2339,9 @@ Return ONLY valid JSON. If a field is unknown, do your own research and fill in
 
     try:
         response = await gemini_generate(
-            system_message="You are an expert pharmacist who corrects OCR errors in prescription text and provides detailed medication guidance. Always return valid JSON.",
-            user_text=prompt
+            system_message=PRESCRIPTION_ANALYSIS_SYSTEM_PROMPT,
+            user_text=prompt,
+            site="prescription_analysis",
         )
         
         # Try to parse JSON response
@@ -1474,7 +2429,7 @@ Return ONLY valid JSON. If a field is unknown, do your own research and fill in
 @api_router.post("/prescriptions/upload", response_model=PrescriptionAnalysisResponse)
 async def upload_prescription(
     file: UploadFile = File(...),
-    username: str = Depends(verify_token)
+    username: str = Depends(rate_limited("prescription_upload"))
 ):
     """Upload a prescription image, extract text, and get AI analysis."""
     
@@ -1553,6 +2508,7 @@ async def upload_prescription(
                 created_at
             )
         )
+        await _user_data_changed(user_id)
         
         # Helper to convert lists to strings for response
         def format_for_response(val):
@@ -1609,27 +2565,24 @@ async def get_prescription_history(
         (user_id, limit)
     )
     
-    results = []
-    for p in prescriptions:
-        results.append(
-            PrescriptionAnalysisResponse(
-                id=str(p["id"]),
-                user_id=str(p["user_id"]),
-                medication_name=p["medication_name"],
-                dosage=p.get("dosage"),
-                frequency=p.get("frequency"),
-                timing=p.get("timing"),
-                purpose=p.get("purpose"),
-                side_effects=p.get("side_effects"),
-                interactions=p.get("interactions"),
-                personalized_advice=p.get("personalized_advice"),
-                extracted_text=p["extracted_text"],
-                ai_analysis=p["ai_analysis"],
-                created_at=p["created_at"]
-            )
-        )
-    
-    return results
+    return _list_response(prescriptions, _prescription_fields, PrescriptionAnalysisResponse)
+
+def _prescription_fields(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(p["id"]),
+        "user_id": str(p["user_id"]),
+        "medication_name": p["medication_name"],
+        "dosage": p.get("dosage"),
+        "frequency": p.get("frequency"),
+        "timing": p.get("timing"),
+        "purpose": p.get("purpose"),
+        "side_effects": p.get("side_effects"),
+        "interactions": p.get("interactions"),
+        "personalized_advice": p.get("personalized_advice"),
+        "extracted_text": p["extracted_text"],
+        "ai_analysis": p["ai_analysis"],
+        "created_at": p["created_at"],
+    }
 
 @api_router.get("/prescriptions/{prescription_id}", response_model=PrescriptionAnalysisResponse)
 async def get_prescription(
@@ -1657,30 +2610,47 @@ async def get_prescription(
     if not prescription:
         raise HTTPException(status_code=404, detail="Prescription not found")
     
-    return PrescriptionAnalysisResponse(
-        id=str(prescription["id"]),
-        user_id=str(prescription["user_id"]),
-        medication_name=prescription["medication_name"],
-        dosage=prescription.get("dosage"),
-        frequency=prescription.get("frequency"),
-        timing=prescription.get("timing"),
-        purpose=prescription.get("purpose"),
-        side_effects=prescription.get("side_effects"),
-        interactions=prescription.get("interactions"),
-        personalized_advice=prescription.get("personalized_advice"),
-        extracted_text=prescription["extracted_text"],
-        ai_analysis=prescription["ai_analysis"],
-        created_at=prescription["created_at"]
-    )
+    return PrescriptionAnalysisResponse(**_prescription_fields(prescription))
 
 # ==================== HEALTH REPORT GENERATION ====================
 
-from pdf_generator import create_health_report_pdf
-from fastapi.responses import StreamingResponse
+from report_renderer import ReportRenderPool, RenderPoolSaturated
+from report_cache import ReportCache
+from pdf_generator import LOG_ROWS_PER_TYPE as REPORT_LOG_ROWS_PER_TYPE, TEMPLATE_VERSION as REPORT_TEMPLATE_VERSION
+
+# PDF layout runs in worker processes; REPORT_RENDER_WORKERS=0 renders on a thread instead
+report_renderer = ReportRenderPool(
+    workers=int(os.environ.get('REPORT_RENDER_WORKERS', '2')),
+    max_pending=int(os.environ.get('REPORT_RENDER_MAX_PENDING', '8')),
+)
+
+REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+report_cache = ReportCache(
+    Path(os.environ.get('REPORT_CACHE_DIR', str(ROOT_DIR / '.cache' / 'reports'))),
+    max_bytes=int(os.environ.get('REPORT_CACHE_MAX_MB', '256')) * 1024 * 1024,
+)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+def _report_headers(username: str, etag: str) -> Dict[str, str]:
+    return {
+        "Content-Disposition": f"attachment; filename=health_report_{username}_{datetime.now().strftime('%Y%m%d')}.pdf",
+        "ETag": etag,
+        # Clients may keep the file but must revalidate; a 304 costs one query
+        "Cache-Control": "private, no-cache",
+    }
 
 @api_router.post("/health/generate-report")
 @api_router.get("/health/generate-report")
 async def generate_health_report(
+    request: Request,
     token: str = None
 ):
     """Generate a comprehensive PDF health report for the user."""
@@ -1694,63 +2664,214 @@ async def generate_health_report(
         raise HTTPException(status_code=401, detail="Token required")
     
     # Fetch user
-    user = await fetch_one("SELECT * FROM users WHERE username=%s", (username,))
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user_id = int(user["id"])
     
+    # Reports are cached per data version; a match skips every query, Gemini call and render
+    cache_key = await _report_cache_key(user_id)
+    if cache_key is not None:
+        cached = report_cache.lookup(cache_key)
+        if cached is not None:
+            path, etag = cached
+            if _etag_matches(request.headers.get("if-none-match"), etag):
+                report_cache.record_not_modified()
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+            return FileResponse(path, media_type="application/pdf", headers=_report_headers(username, etag))
+
+    # Cached reports are free; only a new render (and its AI summary) counts against the limit
+    await enforce_rate_limit(request, username, "report")
+
+    timings: Dict[str, float] = {}
     try:
-        # Fetch health profile
-        profile = await fetch_one(
-            "SELECT * FROM health_profiles WHERE user_id=%s",
-            (user_id,)
+        path, etag = await _produce_health_report(user_id, username, cache_key, timings)
+        headers = {
+            "Content-Disposition": f"attachment; filename=health_report_{username}_{datetime.now().strftime('%Y%m%d')}.pdf",
+            "Server-Timing": _server_timing(timings),
+        }
+        if etag is not None:
+            headers.update(_report_headers(username, etag))
+            return FileResponse(path, media_type="application/pdf", headers=headers)
+        return FileResponse(
+            path,
+            media_type="application/pdf",
+            headers=headers,
+            background=BackgroundTask(ReportCache.discard, path),
         )
         
-        if not profile:
-            raise HTTPException(status_code=404, detail="Health profile not found")
-        
-        profile_data = dict(profile)
-        
-        # Fetch all timeline entries
-        entries = await fetch_all(
-            """SELECT * FROM timeline_entries 
-               WHERE user_id=%s 
-               ORDER BY timestamp DESC""",
-            (user_id,)
+    except HTTPException:
+        raise
+    except RenderPoolSaturated as e:
+        logger.warning(f"Health report for user {user_id} rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many reports are being generated right now, please try again shortly",
+            headers={"Retry-After": "5"},
         )
-        
-        timeline_entries = []
-        for entry in entries:
-            entry_dict = dict(entry)
-            # Convert datetime to ISO string
-            if entry_dict.get('timestamp') and isinstance(entry_dict['timestamp'], datetime):
-                entry_dict['timestamp'] = entry_dict['timestamp'].isoformat()
-            if entry_dict.get('created_at') and isinstance(entry_dict['created_at'], datetime):
-                entry_dict['created_at'] = entry_dict['created_at'].isoformat()
-            # Parse tags if they're JSON string
-            if entry_dict.get('tags'):
-                try:
-                    if isinstance(entry_dict['tags'], str):
-                        entry_dict['tags'] = json.loads(entry_dict['tags'])
-                except:
-                    entry_dict['tags'] = []
-            timeline_entries.append(entry_dict)
-        
-        # Fetch insights data
-        insights = await get_health_patterns(username)
-        
-        # Get health score
-        recent_entries = await _get_recent_timeline_entries(user_id, days=7)
-        health_score_breakdown = compute_health_score(recent_entries)
-        health_score_data = {
-            'score': health_score_breakdown.score,
-            'label': health_score_breakdown.label,
-            'reason': health_score_breakdown.reason
-        }
-        
-        # Generate AI summary using Gemini
-        summary_prompt = f"""
+    except Exception as e:
+        logger.error(f"Error generating health report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate health report: {str(e)}")
+
+async def _report_cache_key(user_id: int) -> Optional[str]:
+    if not REPORT_CACHE_ENABLED:
+        return None
+    version_row = await fetch_one("SELECT version FROM user_data_versions WHERE user_id=%s", (user_id,))
+    data_version = int(version_row["version"]) if version_row else 0
+    return report_cache.make_key(
+        user_id, data_version, REPORT_TEMPLATE_VERSION, datetime.utcnow().strftime('%Y-%m-%d')
+    )
+
+async def _produce_health_report(
+    user_id: int,
+    username: str,
+    cache_key: Optional[str],
+    timings: Dict[str, float],
+) -> Tuple[Path, Optional[str]]:
+    """Build and render a report to disk, returning (path, etag).
+
+    With a ``cache_key`` the file is stored in the report cache and the ETag
+    is set; otherwise, or if the cache cannot be written, it is a temporary
+    file (ETag None) the caller removes.
+    """
+    # Stages: independent reads run together, then the AI summaries run together,
+    # then the PDF is rendered. Durations are returned in the Server-Timing header.
+    started = time.perf_counter()
+    # Only the last 30 days and the newest rows per type are read, so the
+    # cost of a report does not grow with the user's lifetime history
+    thirty_days_ago = to_dt(datetime.utcnow() - timedelta(days=30))
+    profile, entries, log_rows, type_counts, pres_rows = await _timed_stage("load", asyncio.gather(
+        fetch_one("SELECT * FROM health_profiles WHERE user_id=%s", (user_id,)),
+        fetch_all(
+            "SELECT * FROM timeline_entries WHERE user_id=%s AND timestamp >= %s",
+            (user_id, thirty_days_ago),
+        ),
+        _fetch_report_log(user_id),
+        _fetch_report_type_counts(user_id),
+        _fetch_report_prescriptions(user_id),
+    ), timings)
+    
+    if not profile:
+        raise HTTPException(status_code=404, detail="Health profile not found")
+    
+    profile_data = dict(profile)
+
+    # Derived from the rows already loaded: 30-day stats and the 7-day score
+    derive_start = time.perf_counter()
+    insights = _health_pattern_stats(entries)
+    health_score_data = _health_score_from_entries(entries)
+    timeline_entries = [_report_timeline_entry(entry) for entry in log_rows]
+    prescriptions = [dict(p) for p in pres_rows]
+    timings["derive"] = (time.perf_counter() - derive_start) * 1000
+    
+    ai_summary, prescription_ai_summary = await _timed_stage("ai", asyncio.gather(
+        _timed_stage(
+            "ai_summary",
+            _report_ai_summary(username, profile_data, insights, health_score_data, timeline_entries),
+            timings,
+        ),
+        _timed_stage("prescription_summary", _report_prescription_summary(prescriptions), timings),
+    ), timings)
+
+    # Render off the event loop straight to disk; the file is then streamed
+    # to the client in chunks instead of being held in memory
+    spool_path = None
+    if cache_key is not None:
+        try:
+            spool_path = report_cache.spool()
+        except OSError as e:
+            # The cache is an optimisation: render to a temporary file and serve it uncached
+            logger.warning(f"Report cache unavailable for user {user_id}, serving uncached: {e}")
+            cache_key = None
+    if spool_path is None:
+        fd, spooled = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        spool_path = Path(spooled)
+    try:
+        await _timed_stage("render", report_renderer.render_to_file(
+            str(spool_path),
+            username=username,
+            profile_data=profile_data,
+            timeline_entries=timeline_entries,
+            insights_data=insights,
+            ai_summary=ai_summary,
+            health_score_data=health_score_data,
+            prescriptions=prescriptions,
+            prescription_ai_summary=prescription_ai_summary,
+            entry_counts=type_counts,
+        ), timings)
+    except BaseException:
+        ReportCache.discard(spool_path)
+        raise
+    timings["total"] = (time.perf_counter() - started) * 1000
+    logger.info(f"Health report for user {user_id} ({sum(type_counts.values())} entries): {_server_timing(timings)}")
+    
+    if cache_key is None:
+        return spool_path, None
+    try:
+        etag = await asyncio.to_thread(report_cache.store_file, cache_key, spool_path)
+    except OSError as e:
+        # Disk full, permissions...: hand back the render as a temporary file instead
+        logger.warning(f"Could not store report for user {user_id} in the cache, serving uncached: {e}")
+        return spool_path, None
+    return report_cache.path_for(cache_key), etag
+
+async def _fetch_report_prescriptions(user_id: int) -> List[Dict[str, Any]]:
+    # Fetch recent prescriptions to include in the report
+    try:
+        return await fetch_all(
+            "SELECT * FROM prescriptions WHERE user_id=%s ORDER BY created_at DESC LIMIT %s",
+            (user_id, 5),
+        )
+    except Exception:
+        return []
+
+async def _fetch_report_log(user_id: int) -> List[Dict[str, Any]]:
+    # Newest rows of each entry type for the detailed log, newest first overall.
+    # Served from idx_timeline_user_type_ts.
+    return await fetch_all(
+        """
+        SELECT id, entry_type, title, description, severity, tags, timestamp FROM (
+            SELECT id, entry_type, title, description, severity, tags, timestamp,
+                   ROW_NUMBER() OVER (PARTITION BY entry_type ORDER BY timestamp DESC, id DESC) AS type_rank
+            FROM timeline_entries
+            WHERE user_id=%s
+        ) ranked
+        WHERE type_rank <= %s
+        ORDER BY timestamp DESC, id DESC
+        """,
+        (user_id, REPORT_LOG_ROWS_PER_TYPE),
+    )
+
+async def _fetch_report_type_counts(user_id: int) -> Dict[str, int]:
+    rows = await fetch_all(
+        "SELECT entry_type, COUNT(*) AS total FROM timeline_entries WHERE user_id=%s GROUP BY entry_type",
+        (user_id,),
+    )
+    return {row["entry_type"]: int(row["total"]) for row in rows}
+
+def _report_timeline_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # Timestamps stay datetimes; the PDF generator formats them directly
+    entry_dict = dict(entry)
+    # Parse tags if they're JSON string
+    if entry_dict.get('tags'):
+        try:
+            if isinstance(entry_dict['tags'], str):
+                entry_dict['tags'] = json.loads(entry_dict['tags'])
+        except:
+            entry_dict['tags'] = []
+    return entry_dict
+
+async def _report_ai_summary(
+    username: str,
+    profile_data: Dict[str, Any],
+    insights: Dict[str, Any],
+    health_score_data: Dict[str, Any],
+    timeline_entries: List[Dict[str, Any]],
+) -> str:
+    # Generate AI summary using Gemini
+    summary_prompt = f"""
         Based on this health data, provide a comprehensive medical summary for a patient report 
         that can be shown to a doctor. Be professional, clear, and concise.
         
@@ -1776,15 +2897,20 @@ async def generate_health_report(
         Provide a 2-3 paragraph professional medical summary highlighting key patterns, 
         concerns, and positive trends. Focus on actionable insights for healthcare providers.
         """
-        
-        try:
-            ai_summary = await gemini_generate(
-                system_message="You are a medical professional creating a health summary for a patient report.",
-                user_text=summary_prompt
-            )
-        except Exception as e:
-            logger.error(f"Gemini generation failed: {e}")
-            ai_summary = f"""
+    
+    try:
+        return await gemini_generate(
+            system_message=REPORT_SUMMARY_SYSTEM_PROMPT,
+            user_text=summary_prompt,
+            site="report_summary",
+        )
+    except Exception as e:
+        logger.error(f"Gemini generation failed: {e}")
+        return _report_fallback_summary(username, insights, health_score_data)
+
+def _report_fallback_summary(username: str, insights: Dict[str, Any], health_score_data: Dict[str, Any]) -> str:
+    # Used when Gemini is unavailable, and by batch exports that skip AI
+    return f"""
             Health Summary for {username}:
             
             The patient has logged {insights.get('total_entries', 0)} health entries over the past 30 days, 
@@ -1797,65 +2923,284 @@ async def generate_health_report(
             This report provides a comprehensive overview of self-reported health data and should be reviewed 
             with the patient for clinical interpretation.
             """
-        
-        # Fetch recent prescriptions to include in the report
+
+async def _report_prescription_summary(prescriptions: List[Dict[str, Any]]) -> Optional[str]:
+    # Create a short prescriptions AI summary to display in report
+    if not prescriptions:
+        return None
+    try:
+        meds_list = [p.get('medication_name') or 'Unknown' for p in prescriptions]
+        pres_prompt = f"Provide a 2-3 sentence professional summary of the following prescriptions and any high-level safety notes or common interactions. Medications: {', '.join(meds_list)}. Keep it concise for inclusion in a medical report."
+        return await gemini_generate(
+            system_message=PRESCRIPTION_SUMMARY_SYSTEM_PROMPT,
+            user_text=pres_prompt,
+            site="prescription_summary",
+        )
+    except Exception:
+        return None
+
+# ==================== REPORT JOBS ====================
+
+# POST /api/reports queues a report and returns at once; the client polls
+# GET /api/reports/{id} and, when it is done, downloads the stored PDF from a
+# short-lived signed link that needs no bearer token.
+REPORT_JOB_DIR = Path(os.environ.get('REPORT_JOB_DIR', str(ROOT_DIR / '.cache' / 'report_jobs')))
+REPORT_JOB_RETENTION_HOURS = int(os.environ.get('REPORT_JOB_RETENTION_HOURS', '24'))
+REPORT_DOWNLOAD_TTL_SECONDS = int(os.environ.get('REPORT_DOWNLOAD_TTL_SECONDS', '300'))
+# An active job not updated for this long was lost (e.g. to a restart) and no longer blocks the user
+REPORT_JOB_STALE_SECONDS = int(os.environ.get('REPORT_JOB_STALE_SECONDS', '600'))
+report_job_queue = BackgroundTaskQueue(
+    workers=int(os.environ.get('REPORT_JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('REPORT_JOB_MAX_PENDING', '100')),
+    max_attempts=int(os.environ.get('REPORT_JOB_MAX_ATTEMPTS', '3')),
+)
+
+def _report_job_path(job_id: int) -> Path:
+    return REPORT_JOB_DIR / f"report_{job_id}.pdf"
+
+def _save_report_artifact(source: Path, target: Path, move: bool) -> int:
+    """Put a rendered report at ``target`` and return its size.
+
+    A temporary render is moved; a cached one is hard-linked (copied when the
+    directories are on different filesystems) so cache eviction cannot remove
+    a file a download link still points to.
+    """
+    REPORT_JOB_DIR.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    if move:
+        shutil.move(str(source), partial)
+    else:
         try:
-            pres_rows = await fetch_all(
-                "SELECT * FROM prescriptions WHERE user_id=%s ORDER BY created_at DESC LIMIT %s",
-                (user_id, 5),
-            )
-        except Exception:
-            pres_rows = []
-
-        prescriptions = []
-        for p in pres_rows:
-            pr = dict(p)
-            # Keep original fields; some fields may be JSON strings
-            # Try to parse fields that might be JSON
-            for key in ['medication_name', 'dosage', 'frequency', 'timing', 'personalized_advice', 'ai_analysis']:
-                val = pr.get(key)
-                if isinstance(val, str):
-                    # leave as-is; it may already be a readable string
-                    pr[key] = val
-            prescriptions.append(pr)
-
-        # Create a short prescriptions AI summary to display in report
-        prescription_ai_summary = None
+            os.link(source, partial)
+        except OSError:
+            shutil.copyfile(source, partial)
+    os.replace(partial, target)
+    # rename() does nothing when both names are already links to the same file
+    partial.unlink(missing_ok=True)
+    # Drop artifacts whose jobs are past retention
+    cutoff = time.time() - REPORT_JOB_RETENTION_HOURS * 3600
+    for path in REPORT_JOB_DIR.glob("report_*.pdf"):
         try:
-            if prescriptions:
-                meds_list = [p.get('medication_name') or 'Unknown' for p in prescriptions]
-                pres_prompt = f"Provide a 2-3 sentence professional summary of the following prescriptions and any high-level safety notes or common interactions. Medications: {', '.join(meds_list)}. Keep it concise for inclusion in a medical report."
-                prescription_ai_summary = await gemini_generate(
-                    system_message="You are a concise clinical pharmacist summarizing prescriptions for a patient report.",
-                    user_text=pres_prompt,
-                )
-        except Exception:
-            prescription_ai_summary = None
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+    return target.stat().st_size
+
+def _report_download_token(job_id: int, user_id: int) -> Tuple[str, datetime]:
+    expires_at = datetime.utcnow() + timedelta(seconds=REPORT_DOWNLOAD_TTL_SECONDS)
+    payload = {"purpose": "report_download", "job": job_id, "uid": user_id, "exp": expires_at}
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM), expires_at
+
+async def _set_report_job_status(
+    job_id: int,
+    status_value: str,
+    attempts: int,
+    error: Optional[str] = None,
+    file_size: Optional[int] = None,
+) -> None:
+    # active_user_id is only set while the job is queued or running
+    active = status_value in ("queued", "running")
+    await execute(
+        """
+        UPDATE report_jobs
+        SET status=%s, attempts=%s, error=%s, file_size=%s,
+            active_user_id=IF(%s, active_user_id, NULL), updated_at=%s
+        WHERE id=%s
+        """,
+        (status_value, attempts, error, file_size, active, to_dt(datetime.utcnow()), job_id),
+    )
 
-        # Generate PDF
-        pdf_buffer = create_health_report_pdf(
-            username=username,
-            profile_data=profile_data,
-            timeline_entries=timeline_entries,
-            insights_data=insights,
-            ai_summary=ai_summary,
-            health_score_data=health_score_data,
-            prescriptions=prescriptions,
-            prescription_ai_summary=prescription_ai_summary,
-        )
-        
-        # Return PDF as streaming response
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=health_report_{username}_{datetime.now().strftime('%Y%m%d')}.pdf"
-            }
+async def _run_report_job(job_id: int, user_id: int, username: str, attempt: int) -> None:
+    await _set_report_job_status(job_id, "running", attempt)
+    try:
+        cache_key = await _report_cache_key(user_id)
+        cached = report_cache.lookup(cache_key) if cache_key is not None else None
+        if cached is not None:
+            source, etag = cached
+        else:
+            source, etag = await _produce_health_report(user_id, username, cache_key, {})
+        # Without an ETag the source is a temporary render of ours to move, not a cache entry
+        file_size = await asyncio.to_thread(
+            _save_report_artifact, source, _report_job_path(job_id), etag is None
         )
-        
     except Exception as e:
-        logger.error(f"Error generating health report: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate health report: {str(e)}")
+        if isinstance(e, HTTPException) and 400 <= e.status_code < 500:
+            # e.g. no health profile: a retry would fail the same way
+            raise PermanentJobError(e.detail) from e
+        await _set_report_job_status(job_id, "queued", attempt, error=str(e))
+        raise
+    await _set_report_job_status(job_id, "done", attempt, file_size=file_size)
+
+def _report_job_response(row: Dict[str, Any]) -> Dict[str, Any]:
+    job_id = int(row["id"])
+    response = {
+        "id": str(job_id),
+        "status": row["status"],
+        "attempts": row.get("attempts", 0),
+        "error": row.get("error"),
+        "created_at": row["created_at"].isoformat() if isinstance(row.get("created_at"), datetime) else row.get("created_at"),
+    }
+    if row["status"] == "done":
+        if _report_job_path(job_id).exists():
+            token, expires_at = _report_download_token(job_id, int(row["user_id"]))
+            response["download_url"] = f"/api/reports/{job_id}/download?sig={token}"
+            response["expires_at"] = expires_at.isoformat()
+            response["file_size"] = row.get("file_size")
+        else:
+            response["status"] = "expired"
+    return response
+
+@api_router.post("/reports", status_code=202)
+async def create_report_job(
+    username: str = Depends(rate_limited("report"))
+):
+    """Queue a PDF health report. At most one report per user is queued or running at a time."""
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user_id = int(user["id"])
+    
+    profile = await fetch_one("SELECT id FROM health_profiles WHERE user_id=%s", (user_id,))
+    if not profile:
+        raise HTTPException(status_code=404, detail="Health profile not found")
+    
+    now = datetime.utcnow()
+    await execute(
+        """
+        UPDATE report_jobs SET status='failed', error=%s, active_user_id=NULL, updated_at=%s
+        WHERE active_user_id=%s AND updated_at < %s
+        """,
+        ("Interrupted before completion", to_dt(now), user_id, to_dt(now - timedelta(seconds=REPORT_JOB_STALE_SECONDS))),
+    )
+    try:
+        job_id = await execute(
+            """
+            INSERT INTO report_jobs (user_id, active_user_id, status, attempts, created_at, updated_at)
+            VALUES (%s, %s, 'queued', 0, %s, %s)
+            """,
+            (user_id, user_id, to_dt(now), to_dt(now)),
+        )
+    except aiomysql.IntegrityError:
+        # The unique active_user_id already holds a job for this user: hand that one back
+        row = await fetch_one("SELECT * FROM report_jobs WHERE active_user_id=%s", (user_id,))
+        if not row:
+            raise HTTPException(status_code=409, detail="A report is already being generated")
+        return _report_job_response(row)
+
+    async def run(attempt: int) -> None:
+        await _run_report_job(job_id, user_id, username, attempt)
+
+    async def on_failure(exc: BaseException, attempts: int) -> None:
+        await _set_report_job_status(job_id, "failed", attempts, error=str(exc))
+
+    try:
+        report_job_queue.submit(Job(name=f"report:{job_id}", run=run, on_failure=on_failure))
+    except QueueFull as e:
+        logger.warning(f"Report job {job_id} rejected: {e}")
+        await _set_report_job_status(job_id, "failed", 0, error=str(e))
+        raise HTTPException(
+            status_code=503,
+            detail="Too many reports are queued right now, please try again shortly",
+            headers={"Retry-After": "30"},
+        )
+    return {"id": str(job_id), "status": "queued", "attempts": 0, "error": None, "created_at": now.isoformat()}
+
+@api_router.get("/reports/{job_id}")
+async def get_report_job(
+    job_id: str,
+    username: str = Depends(verify_token)
+):
+    """Status of a report job; once "done" the response carries a short-lived download_url."""
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user_id = int(user["id"])
+    
+    try:
+        job_id_int = int(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid report ID")
+    
+    row = await fetch_one("SELECT * FROM report_jobs WHERE id=%s AND user_id=%s", (job_id_int, user_id))
+    if not row:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    return _report_job_response(row)
+
+@api_router.get("/reports/{job_id}/download")
+async def download_report(job_id: str, sig: str):
+    """Serve a finished report. Authorized by the signed link, not the bearer token."""
+    try:
+        job_id_int = int(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid report ID")
+    try:
+        claims = jwt.decode(sig, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=403, detail="Download link has expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=403, detail="Invalid download link")
+    if claims.get("purpose") != "report_download" or claims.get("job") != job_id_int:
+        raise HTTPException(status_code=403, detail="Invalid download link")
+    
+    row = await fetch_one(
+        "SELECT id, status FROM report_jobs WHERE id=%s AND user_id=%s",
+        (job_id_int, claims.get("uid")),
+    )
+    path = _report_job_path(job_id_int)
+    if not row or row["status"] != "done" or not path.exists():
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=f"health_report_{job_id_int}.pdf",
+        headers={"Cache-Control": "private, no-store"},
+    )
+
+# ==================== AI ENRICHMENT ENDPOINTS ====================
+
+@api_router.get("/enrichments/{enrichment_id}")
+async def get_enrichment(
+    enrichment_id: str,
+    username: str = Depends(verify_token)
+):
+    """Status of a deferred AI step; poll until status is "done" or "failed"."""
+    user = await fetch_one("SELECT id FROM users WHERE username=%s", (username,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_id = int(user["id"])
+
+    try:
+        enrichment_id_int = int(enrichment_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid enrichment ID")
+
+    row = await fetch_one(
+        "SELECT * FROM ai_enrichments WHERE id=%s AND user_id=%s",
+        (enrichment_id_int, user_id),
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Enrichment not found")
+    if row["status"] in ("pending", "running") and await _fail_stale_enrichments(enrichment_id_int):
+        row = await fetch_one("SELECT * FROM ai_enrichments WHERE id=%s", (enrichment_id_int,))
+
+    return {
+        "id": str(row["id"]),
+        "kind": row["kind"],
+        "target_id": str(row["target_id"]),
+        "status": row["status"],
+        "result": row.get("result"),
+        "error": row.get("error"),
+        "attempts": int(row["attempts"]),
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
 
 # ==================== HEALTH ENDPOINT ====================
 
@@ -1863,6 +3208,42 @@ async def generate_health_report(
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+# Internal counters are for monitoring, not app users: the endpoint needs
+# `Authorization: Bearer $METRICS_TOKEN` and does not exist while it is unset
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+metrics_security = HTTPBearer(auto_error=False)
+
+async def verify_metrics_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(metrics_security),
+) -> None:
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+@api_router.get("/metrics", dependencies=[Depends(verify_metrics_token)])
+async def get_metrics():
+    """Runtime counters for the AI layer."""
+    return {
+        "llm_cache": llm_cache.stats(),
+        "llm_provider": llm_provider.stats(),
+        "gemini_limiter": gemini_limiter.stats(),
+        "gemini_breaker": gemini_breaker.stats(),
+        "gemini_hedging": gemini_hedger.stats(),
+        "enrichment_queue": enrichment_queue.stats(),
+        "chat_context_cache": chat_context_cache.stats(),
+        "report_renderer": report_renderer.stats(),
+        "report_cache": report_cache.stats(),
+        "report_jobs": report_job_queue.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "compression": response_compression.stats(),
+        "chat_stream": {
+            "time_to_first_token": chat_stream_ttft.stats(),
+            "total": chat_stream_total.stats(),
+        },
+    }
+
 # Include router
 app.include_router(api_router)
 
@@ -1874,6 +3255,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for JSON and text bodies (see compression.py); PDFs, SSE and
+# responses that set their own Content-Encoding pass through untouched
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+response_compression = CompressionStats()
+if COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.environ.get('COMPRESSION_MIN_BYTES', '1024')),
+        gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6')),
+        brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4')),
+        stats=response_compression,
+    )
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1888,10 +3282,44 @@ async def on_startup():
     # Initialize tables
     async with db_pool.acquire() as conn:
         await init_db(conn)
+    # Enrichments a previous process had queued are gone with it
+    stale_enrichments = await _fail_stale_enrichments()
+    if stale_enrichments:
+        logger.info(f"Marked {stale_enrichments} interrupted enrichment(s) failed")
+    await enrichment_queue.start()
+    await report_job_queue.start()
+    if REPORT_CACHE_ENABLED:
+        try:
+            cached_reports = await asyncio.to_thread(report_cache.load)
+            logger.info(f"Report cache ready at {report_cache.directory} ({cached_reports} file(s))")
+        except OSError as e:
+            logger.warning(f"Report cache unavailable: {e}")
+    try:
+        await report_renderer.start()
+    except Exception as e:
+        logger.warning(f"Report render pool warm-up failed, workers will start on first use: {e}")
+    # Build the shared Gemini model handles before the first request needs them
+    try:
+        llm_provider.warm_up(GEMINI_MODEL, KNOWN_SYSTEM_PROMPTS)
+    except Exception as e:
+        logger.warning(f"Gemini model warm-up skipped: {e}")
+    if LLM_CACHE_ENABLED:
+        try:
+            pruned = await asyncio.to_thread(llm_cache.prune_expired)
+            logger.info(f"LLM cache ready at {LLM_CACHE_PATH} ({pruned} expired entries pruned)")
+        except Exception as e:
+            logger.warning(f"LLM cache unavailable, continuing without disk tier: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     global db_pool
+    # Let in-flight enrichment and report jobs finish while the pool is still open
+    await enrichment_queue.stop()
+    await report_job_queue.stop()
+    await report_renderer.stop()
+    await password_hasher.stop()
+    await rate_limiter.store.close()
     if db_pool is not None:
         db_pool.close()
         await db_pool.wait_closed()
+    llm_cache.close()
@@ -0,0 +1,129 @@
+"""
+Background Task Queue
+A small in-process job queue: a fixed pool of asyncio workers, a bounded
+backlog and retries with exponential backoff. Used to run AI enrichment
+after the HTTP response has been sent.
+
+Jobs live in memory only; anything still queued when the process stops is
+lost, so callers keep the durable status in the database.
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the backlog is at capacity."""
+
+
+class PermanentJobError(Exception):
+    """Raised by a job that cannot succeed on a retry; it fails at once."""
+
+
+@dataclass
+class Job:
+    name: str
+    run: Callable[[int], Awaitable[None]]  # receives the attempt number (1-based)
+    on_failure: Optional[Callable[[BaseException, int], Awaitable[None]]] = None
+    attempts: int = 0
+
+
+class BackgroundTaskQueue:
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 500,
+        max_attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 30.0,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._retry_timers: "set[asyncio.Task[None]]" = set()
+        self.running = 0
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "retried": 0, "rejected": 0}
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        # Capacity is enforced in submit() so retries can always be re-queued
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logging.info(f"Background task queue started with {self.workers} worker(s)")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Give queued jobs up to ``timeout`` seconds to finish, then cancel the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Background task queue stopped with {self._queue.qsize()} job(s) unfinished")
+        for task in list(self._retry_timers) + self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_timers, return_exceptions=True)
+        self._tasks = []
+        self._retry_timers.clear()
+
+    def submit(self, job: Job) -> None:
+        if self._queue is None:
+            raise RuntimeError("Background task queue is not started")
+        if self._queue.qsize() >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise QueueFull(f"Background queue is full ({self.max_pending} pending)")
+        self._queue.put_nowait(job)
+        self.counters["submitted"] += 1
+
+    async def _retry_later(self, job: Job, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            self._queue.put_nowait(job)
+        finally:
+            self._retry_timers.discard(asyncio.current_task())
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            job.attempts += 1
+            self.running += 1
+            try:
+                await job.run(job.attempts)
+                self.counters["succeeded"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if job.attempts < self.max_attempts and not isinstance(e, PermanentJobError):
+                    delay = min(self.max_delay, self.base_delay * (2 ** (job.attempts - 1)))
+                    delay *= random.uniform(0.5, 1.0)
+                    self.counters["retried"] += 1
+                    logging.warning(f"Job {job.name} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {e}")
+                    timer = asyncio.create_task(self._retry_later(job, delay))
+                    self._retry_timers.add(timer)
+                else:
+                    self.counters["failed"] += 1
+                    logging.error(f"Job {job.name} failed after {job.attempts} attempt(s): {e}")
+                    if job.on_failure is not None:
+                        try:
+                            await job.on_failure(e, job.attempts)
+                        except Exception as cb_error:
+                            logging.error(f"Failure handler for {job.name} raised: {cb_error}")
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "retry_scheduled": len(self._retry_timers),
+            **self.counters,
+        }
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -23,6 +23,8 @@ import { MarkdownText } from '../../components/MarkdownText';
 import { colors, spacing } from '../../constants/theme';
 
 const BACKEND_URL = API_BASE_URL;
+const ENRICHMENT_POLL_MS = 1500;
+const ENRICHMENT_MAX_POLLS = 40;
 
 const bodyParts = [
   { id: 'head', label: 'Head', icon: 'head' as keyof typeof Ionicons.glyphMap, position: { top: 50, left: '42%' } },
@@ -47,6 +49,43 @@ export default function BodyMap() {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [analysisResult, setAnalysisResult] = useState<any>(null);
   const [resultModalVisible, setResultModalVisible] = useState(false);
+  const pollTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  useEffect(() => {
+    return () => {
+      if (pollTimer.current) clearTimeout(pollTimer.current);
+    };
+  }, []);
+
+  // The analysis is generated in the background; poll until it is ready
+  const pollEnrichment = (enrichmentId: string, attempt = 0) => {
+    pollTimer.current = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${BACKEND_URL}/api/enrichments/${enrichmentId}`, {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+        });
+        const { status, result } = response.data;
+        if (status === 'done') {
+          setAnalysisResult((prev: any) => prev && { ...prev, analysis: result, enrichment_status: status });
+          return;
+        }
+        if (status === 'failed' || status === 'superseded' || attempt + 1 >= ENRICHMENT_MAX_POLLS) {
+          setAnalysisResult((prev: any) => prev && {
+            ...prev,
+            analysis: 'We could not analyze this symptom right now. Please try again later.',
+            enrichment_status: 'failed',
+          });
+          return;
+        }
+      } catch (error) {
+        console.error('Error polling analysis:', error);
+      }
+      pollEnrichment(enrichmentId, attempt + 1);
+    }, ENRICHMENT_POLL_MS);
+  };
+
   const handleBodyPartPress = (partId: string) => {
     setSelectedPart(partId);
     setModalVisible(true);
@@ -72,6 +111,10 @@ export default function BodyMap() {
       );
 
       setAnalysisResult(response.data);
+      if (response.data.enrichment_status === 'pending') {
+        if (pollTimer.current) clearTimeout(pollTimer.current);
+        pollEnrichment(response.data.enrichment_id);
+      }
       setModalVisible(false);
       setResultModalVisible(true);
       setPainLevel(3);
@@ -310,7 +353,14 @@ export default function BodyMap() {
                 </View>
 
                 <View style={styles.analysisContent}>
-                  <MarkdownText content={analysisResult.analysis} variant="dark" />
+                  {analysisResult.analysis ? (
+                    <MarkdownText content={analysisResult.analysis} variant="dark" />
+                  ) : (
+                    <View style={styles.analyzingRow}>
+                      <ActivityIndicator color="#6366F1" />
+                      <Text style={styles.analyzingText}>Analyzing…</Text>
+                    </View>
+                  )}
                 </View>
 
                 <View style={styles.disclaimerCard}>
@@ -545,6 +595,15 @@ const styles = StyleSheet.create({
     borderWidth: 1,
     borderColor: '#334155',
   },
+  analyzingRow: {
+    flexDirection: 'row',
+    alignItems: 'center',
+    gap: 12,
+  },
+  analyzingText: {
+    fontSize: 14,
+    color: '#94A3B8',
+  },
   disclaimerCard: {
     flexDirection: 'row',
     backgroundColor: '#F59E0B20',
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -21,6 +21,9 @@ import { LinearGradient } from 'expo-linear-gradient';
 import { colors, spacing } from '../../constants/theme';
 
 const BACKEND_URL = API_BASE_URL;
+const ENRICHMENT_POLL_MS = 1500;
+const ENRICHMENT_MAX_POLLS = 40;
+const FALLBACK_FEEDBACK = 'Great job! Keep up the momentum!';
 
 interface Challenge {
   id: string;
@@ -94,9 +97,13 @@ export default function Challenges() {
   const [selectedChallenge, setSelectedChallenge] = useState<Challenge | null>(null);
   const [checkInNotes, setCheckInNotes] = useState('');
   const [isSubmitting, setIsSubmitting] = useState(false);
+  const pollTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   useEffect(() => {
     loadChallenges();
+    return () => {
+      if (pollTimer.current) clearTimeout(pollTimer.current);
+    };
   }, []);
 
   const loadChallenges = async () => {
@@ -135,6 +142,37 @@ export default function Challenges() {
     }
   };
 
+  const showCheckInResult = (feedback: string, checkIn: any) => {
+    Alert.alert(
+      'Great Job! 🎉',
+      `${feedback}\n\nCompleted: ${checkIn.completed_days} days${checkIn.badges.length > 0 ? '\n🏆 New badges earned!' : ''}`,
+      [{ text: 'Awesome!' }]
+    );
+  };
+
+  // The coach's feedback is generated in the background; poll until it is ready
+  const pollFeedback = (enrichmentId: string, checkIn: any, attempt = 0) => {
+    pollTimer.current = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${BACKEND_URL}/api/enrichments/${enrichmentId}`, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        const { status, result } = response.data;
+        if (status === 'done') {
+          showCheckInResult(result || FALLBACK_FEEDBACK, checkIn);
+          return;
+        }
+        if (status === 'failed' || status === 'superseded' || attempt + 1 >= ENRICHMENT_MAX_POLLS) {
+          showCheckInResult(FALLBACK_FEEDBACK, checkIn);
+          return;
+        }
+      } catch (error) {
+        console.error('Error polling feedback:', error);
+      }
+      pollFeedback(enrichmentId, checkIn, attempt + 1);
+    }, ENRICHMENT_POLL_MS);
+  };
+
   const handleCheckIn = async () => {
     if (!selectedChallenge) return;
 
@@ -153,11 +191,12 @@ export default function Challenges() {
       setCheckInNotes('');
       loadChallenges();
 
-      Alert.alert(
-        'Great Job! 🎉',
-        `${response.data.ai_feedback}\n\nCompleted: ${response.data.completed_days} days${response.data.badges.length > 0 ? '\n🏆 New badges earned!' : ''}`,
-        [{ text: 'Awesome!' }]
-      );
+      if (response.data.enrichment_status === 'pending') {
+        if (pollTimer.current) clearTimeout(pollTimer.current);
+        pollFeedback(response.data.enrichment_id, response.data);
+      } else {
+        showCheckInResult(response.data.ai_feedback || FALLBACK_FEEDBACK, response.data);
+      }
     } catch (error: any) {
       Alert.alert('Error', error.response?.data?.detail || 'Failed to check in');
     } finally {
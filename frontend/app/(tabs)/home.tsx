@@ -139,36 +139,18 @@ export default function Home() {
     }
   }, [token]);
 
-  const loadQuickInsights = useCallback(async () => {
+  const loadDashboard = useCallback(async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/insights/patterns`, {
+      // One aggregated request instead of four separate round trips
+      const response = await axios.get(`${BACKEND_URL}/api/home?entries_limit=5`, {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setInsights(response.data);
+      setEntries(response.data.entries || []);
+      setInsights(response.data.insights);
+      setHealthProfile(response.data.profile);
+      setActiveChallenges(response.data.challenges || []);
     } catch (error) {
-      console.error('Error loading insights:', error);
-    }
-  }, [token]);
-
-  const loadHealthProfile = useCallback(async () => {
-    try {
-      const response = await axios.get(`${BACKEND_URL}/api/health/profile`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-      setHealthProfile(response.data);
-    } catch (error) {
-      console.error('Error loading health profile:', error);
-    }
-  }, [token]);
-
-  const loadActiveChallenges = useCallback(async () => {
-    try {
-      const response = await axios.get(`${BACKEND_URL}/api/challenges/active`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-      setActiveChallenges(response.data);
-    } catch (error) {
-      console.error('Error loading challenges:', error);
+      console.error('Error loading dashboard:', error);
     }
   }, [token]);
 
@@ -179,18 +161,13 @@ export default function Home() {
       }
       setRefreshing(true);
       try {
-        await Promise.all([
-          loadEntries(),
-          loadQuickInsights(),
-          loadHealthProfile(),
-          loadActiveChallenges(),
-        ]);
+        await loadDashboard();
       } finally {
         setIsLoading(false);
         setRefreshing(false);
       }
     },
-    [loadEntries, loadQuickInsights, loadHealthProfile, loadActiveChallenges]
+    [loadDashboard]
   );
 
   useEffect(() => {
@@ -20,6 +20,9 @@ import { MarkdownText } from '../../components/MarkdownText';
 import { LinearGradient } from 'expo-linear-gradient';
 import { colors, spacing } from '../../constants/theme';
 
+const REPORT_POLL_MS = 2000;
+const REPORT_MAX_POLLS = 60;
+
 interface HealthProfile {
   sleep_pattern: string;
   sleep_hours: number;
@@ -60,11 +63,23 @@ export default function Profile() {
   const handleGenerateReport = async () => {
     setIsGeneratingReport(true);
     try {
-      // Encode the token to make it URL-safe
-      const encodedToken = encodeURIComponent(token || '');
-      
-      // Create URL with token as query parameter for the backend to accept
-      const pdfUrl = `${API_BASE_URL}/api/health/generate-report?token=${encodedToken}`;
+      const headers = { Authorization: `Bearer ${token}` };
+
+      // The report is generated in the background; poll the job until it is ready
+      let job = (await axios.post(`${API_BASE_URL}/api/reports`, {}, { headers })).data;
+      for (let attempt = 0; job.status === 'queued' || job.status === 'running'; attempt++) {
+        if (attempt >= REPORT_MAX_POLLS) {
+          throw new Error('Report generation timed out');
+        }
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_MS));
+        job = (await axios.get(`${API_BASE_URL}/api/reports/${job.id}`, { headers })).data;
+      }
+      if (job.status !== 'done' || !job.download_url) {
+        throw new Error(job.error || 'Report generation failed');
+      }
+
+      // Signed link that expires after a few minutes; the login token stays out of the URL
+      const pdfUrl = `${API_BASE_URL}${job.download_url}`;
       
       // Try to open the URL in browser/PDF viewer
       const canOpen = await Linking.canOpenURL(pdfUrl);